@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class AuthTokenConfig(AppConfig):
+    name = 'authtoken'
+
+    def ready(self):
+        from .signals import handlers  # noqa
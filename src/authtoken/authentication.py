@@ -1,9 +1,61 @@
+import threading
+import time
+
 from rest_framework import authentication, exceptions
 from rest_framework.authentication import get_authorization_header
+from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 from .models import Token
 
 
+class TokenCache:
+    """In-process cache of the valid tokens, keyed by the token key.
+
+    A cached token is invalidated when it is saved or deleted in the same
+    process. Other processes keep using it until it expires after
+    `API_TOKEN_CACHE_TTL` seconds, which bounds the time it takes for a
+    revocation to take effect.
+
+    Only the field values of a token are cached, and every lookup gets its
+    own token instance, so that requests do not share the instances.
+    """
+
+    field_names = ('key', 'created', 'scopes')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = {}
+
+    def get(self, key):
+        with self._lock:
+            expires, values = self._tokens.get(key, (None, None))
+            if values is None:
+                return None
+            if expires <= time.monotonic():
+                del self._tokens[key]
+                return None
+        return Token.from_db(None, self.field_names, values)
+
+    def set(self, token):
+        ttl = settings.API_TOKEN_CACHE_TTL
+        if ttl <= 0:
+            return
+        values = (token.key, token.created, int(token.scopes))
+        with self._lock:
+            self._tokens[token.key] = (time.monotonic() + ttl, values)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._tokens.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+
+
+token_cache = TokenCache()
+
+
 class TokenAuthentication(authentication.BaseAuthentication):
     """
     Simple token based authentication.
@@ -42,10 +94,13 @@ class TokenAuthentication(authentication.BaseAuthentication):
         return self.authenticate_credentials(token)
 
     def authenticate_credentials(self, key):
-        try:
-            token = self.model.objects.get(key=key)
-        except self.model.DoesNotExist:
-            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        token = token_cache.get(key)
+        if token is None:
+            try:
+                token = self.model.objects.get(key=key)
+            except self.model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            token_cache.set(token)
 
         return (None, token)
 
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from authtoken.authentication import TokenAuthentication, token_cache
+from authtoken.models import Token
+from authtoken.permissions import HasTokenScope
+
+
+class Command(BaseCommand):
+    help = ('Measures the overhead of authenticating a REST request with and '
+            'without the token cache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        authentication = TokenAuthentication()
+        permission = HasTokenScope('products')
+
+        def run(django_request):
+            start = time.perf_counter()
+            for _ in range(n):
+                request = Request(django_request,
+                                  authenticators=[authentication])
+                assert permission.has_permission(request, None)
+            return (time.perf_counter() - start) / n
+
+        # The token is only needed for the benchmark, so it is rolled back.
+        with transaction.atomic():
+            token = Token()
+            token.scopes.products = True
+            token.save()
+            django_request = APIRequestFactory().get(
+                '/', HTTP_AUTHORIZATION='Token {}'.format(token.key)
+            )
+            with override_settings(API_TOKEN_CACHE_TTL=0):
+                uncached = run(django_request)
+            cached = run(django_request)
+            token_cache.invalidate(token.key)
+            transaction.set_rollback(True)
+
+        self.stdout.write('Without cache: {:.1f} us per request'.format(
+            uncached * 10 ** 6
+        ))
+        self.stdout.write('With cache: {:.1f} us per request'.format(
+            cached * 10 ** 6
+        ))
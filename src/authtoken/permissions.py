@@ -20,3 +20,10 @@ class HasTokenScope(permissions.BasePermission):
         if request.auth is None:
             return False
         return getattr(request.auth.scopes, self.scope)
+
+
+class HasToken(permissions.BasePermission):
+    """Allows access to requests authenticated with a token of any scope."""
+
+    def has_permission(self, request, view):
+        return request.auth is not None
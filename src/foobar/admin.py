@@ -1,13 +1,17 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.core.urlresolvers import reverse
 from django.conf import settings
+from django.db import connection
 from django.db.models import Sum
 from django.utils.translation import ugettext_lazy as _
 from foobar.wallet import api as wallet_api
 from shop import api as shop_api
 from moneyed import Money
-from .exceptions import NotCancelableException
-from . import models, api
+from utils.enums import validate_transition
+from utils.exceptions import InvalidTransition
+from utils.exports import csv_response
+from wallet.models import Wallet
+from . import models, api, enums, exports
 
 
 class ReadOnlyMixin(object):
@@ -38,13 +42,28 @@ class PurchaseItemInline(ReadOnlyMixin, admin.TabularInline):
     fields = ('link', 'product_ean', 'qty', 'amount',)
     readonly_fields = ('link', 'product_ean', 'qty', 'amount',)
 
+    def get_product(self, obj):
+        # Resolve the products of all the items of the purchase at once.
+        # Inlines are instantiated per request, so the products are not
+        # cached between requests.
+        if not hasattr(self, '_products'):
+            self._products = {}
+        products = self._products.get(obj.purchase_id)
+        if products is None:
+            product_ids = models.PurchaseItem.objects.filter(
+                purchase_id=obj.purchase_id
+            ).values_list('product_id', flat=True)
+            products = shop_api.get_products(product_ids)
+            self._products[obj.purchase_id] = products
+        return products.get(obj.product_id)
+
     def product_name(self, obj):
-        obj = shop_api.get_product(obj.product_id)
+        obj = self.get_product(obj)
         if obj:
             return obj.name
 
     def product_ean(self, obj):
-        obj = shop_api.get_product(obj.product_id)
+        obj = self.get_product(obj)
         if obj:
             return obj.code
 
@@ -65,9 +84,34 @@ class CardInline(admin.TabularInline):
     extra = 0
 
 
+def wallet_balance_sql(connection):
+    """Returns SQL selecting the balance of the wallet of an account.
+
+    The owner id of a wallet is a string, so the account id is compared in
+    its textual form, which depends on the database.
+    """
+    qn = connection.ops.quote_name
+    account_id = '{}.{}'.format(qn(models.Account._meta.db_table), qn('id'))
+    owner_id = qn('owner_id')
+    if connection.vendor == 'postgresql':
+        condition = '{} = CAST({} AS varchar)'.format(owner_id, account_id)
+    else:
+        # UUIDs are stored as hex strings without dashes
+        condition = "REPLACE({}, '-', '') = {}".format(owner_id, account_id)
+    return (
+        'SELECT {balance} FROM {table} WHERE {condition} AND {currency} = %s'
+    ).format(
+        balance=qn('balance'),
+        table=qn(Wallet._meta.db_table),
+        condition=condition,
+        currency=qn('balance_currency')
+    )
+
+
 @admin.register(models.Account)
 class AccountAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'user', 'balance', 'email')
+    list_select_related = ('user',)
     readonly_fields = ('id', 'wallet_link', 'date_created', 'date_modified')
     inlines = (CardInline, PurchaseInline,)
     search_fields = ('name',)
@@ -105,17 +149,29 @@ class AccountAdmin(admin.ModelAdmin):
             'js/scan-card.js',
         )
 
+    def get_queryset(self, request):
+        # Fetch the balances together with the accounts, so that they can be
+        # listed and sorted without querying the wallets one by one.
+        qs = super().get_queryset(request)
+        return qs.extra(
+            select={'wallet_balance': wallet_balance_sql(connection)},
+            select_params=(settings.DEFAULT_CURRENCY,)
+        )
+
     def balance(self, obj):
-        if obj.id is not None:
-            _, balance = wallet_api.get_balance(obj.id)
-            return balance
+        balance = getattr(obj, 'wallet_balance', None)
+        if balance is not None:
+            return Money(balance, settings.DEFAULT_CURRENCY)
+    balance.admin_order_field = 'wallet_balance'
 
     def wallet_link(self, obj):
         if obj.id is not None:
-            wallet_obj = wallet_api.get_wallet(obj.id)
+            wallet_obj = wallet_api.get_wallet(obj.id, create=False)
+            if wallet_obj is None:
+                return None
             return '<a href="{}">{}</a>'.format(
                 reverse('admin:wallet_wallet_change', args=(wallet_obj.id,)),
-                self.balance(obj)
+                wallet_obj.balance
             )
     wallet_link.allow_tags = True
 
@@ -147,7 +203,7 @@ class PurchaseAdmin(ReadOnlyMixin, admin.ModelAdmin):
     list_filter = (PaymentMethodFilter,)
     change_list_template = 'admin/purchase/list.html'
     date_hierarchy = 'date_created'
-    actions = ['cancel_purchases']
+    actions = ['cancel_purchases', 'export_csv']
 
     class Media:
         css = {'all': ('css/hide_admin_original.css',)}
@@ -157,27 +213,58 @@ class PurchaseAdmin(ReadOnlyMixin, admin.ModelAdmin):
         del actions['delete_selected']
         return actions
 
+    def get_queryset(self, request):
+        # Fetch the current statuses together with the purchases.
+        return super().get_queryset(request).with_current_status()
+
+    def status(self, obj):
+        if obj.current_status is not None:
+            return enums.PurchaseStatus(obj.current_status)
+    status.admin_order_field = 'current_status'
+
     def _amount(self, obj):
         # An ugly trick to force the Django admin to format the money
         # field properly.
         return obj.amount
 
+    def can_cancel(self, obj):
+        if not obj.deletable:
+            return False
+        try:
+            validate_transition(
+                enums.PurchaseStatus,
+                from_state=(enums.PurchaseStatus(obj.current_status)
+                            if obj.current_status is not None else None),
+                to_state=enums.PurchaseStatus.CANCELED
+            )
+        except InvalidTransition:
+            return False
+        return True
+
     def cancel_purchases(self, request, queryset):
-        failed = 0
-        for obj in queryset:
-            try:
-                api.cancel_purchase(obj.id)
-            except NotCancelableException:
-                failed += 1
-        count = queryset.count()
+        # The purchases that can be canceled are canceled in one go, the
+        # rest are left as they are and reported.
+        purchase_objs = list(queryset)
+        purchase_ids = [p.id for p in purchase_objs if self.can_cancel(p)]
+        if purchase_ids:
+            api.cancel_purchases(purchase_ids)
+        count = len(purchase_ids)
+        failed = len(purchase_objs) - count
         if failed:
-            msg = _('Canceled %d purchase(s) (%d failed).')
-            msg = msg % (count - failed, failed)
-        else:
-            msg = _('Canceled %d purchase(s).') % count
+            msg = _('Canceled %d purchase(s) (%d failed).') % (count, failed)
+            return self.message_user(request, msg, level=messages.WARNING)
+        msg = _('Canceled %d purchase(s).') % count
         return self.message_user(request, msg)
     cancel_purchases.short_description = _('Cancel purchases')
 
+    def export_csv(self, request, queryset):
+        return csv_response(
+            'purchases.csv',
+            exports.PURCHASE_HEADER,
+            exports.purchase_rows(queryset)
+        )
+    export_csv.short_description = _('Export as CSV')
+
     def aggregated_sum(self, qs):
         qs = qs.aggregate(total=Sum('amount'))
         return Money(qs['total'] or 0, settings.DEFAULT_CURRENCY)
@@ -211,11 +298,20 @@ class WalletLogEntryAdmin(ReadOnlyMixin, admin.ModelAdmin):
                        'post_balance')
 
     ordering = ('-date_created',)
+    actions = ['export_csv']
 
     def post_balance(self, obj):
         return obj.post_balance
     post_balance.short_description = _('new balance')
 
+    def export_csv(self, request, queryset):
+        return csv_response(
+            'wallet_log_entries.csv',
+            exports.WALLET_LOG_ENTRY_HEADER,
+            exports.wallet_log_entry_rows(queryset)
+        )
+    export_csv.short_description = _('Export as CSV')
+
     def get_actions(self, request):
         actions = super().get_actions(request)
         del actions['delete_selected']
@@ -1,12 +1,16 @@
+import uuid
+from collections import OrderedDict
 from django.conf import settings
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
 from .models import (
-    Account, Card, Purchase, PurchaseItem, WalletLogEntry
+    Account, Card, Purchase, PurchaseItem, PurchaseStatus, WalletLogEntry
 )
+from utils.enums import validate_transition
 from utils.exceptions import InvalidTransition
 from foobar.wallet import api as wallet_api
+from wallet.exceptions import InsufficientFunds
 from shop import api as shop_api
 from shop import enums as shop_enums
 from moneyed import Money
@@ -46,43 +50,75 @@ def update_account(account_id, **kwargs):
 
 
 @transaction.atomic
-def create_purchase(account_id, products):
+def create_purchase(account_id, products, purchase_id=None,
+                    date_created=None):
     """
     Products should be a list of tuples containing paiars of product ids
-    and their quantities. If account_id is None, a cash purchase will be made -
+    and their quantities. Already fetched products can be passed instead of
+    their ids. Quantities of a product listed more than once are added up.
+    If account_id is None, a cash purchase will be made -
     no account will be assigned to the purchase and the money will be
     transfered to the cash wallet.
+
+    The id and the creation time of the purchase can be given, e.g. for
+    purchases made offline.
     """
+    # make sure the quantites are greater than 0
+    assert all(q > 0 for _, q in products)
+    product_objs = {}
+    quantities = OrderedDict()
+    for product, qty in products:
+        if isinstance(product, (uuid.UUID, str)):
+            product_id = uuid.UUID(str(product))
+        else:
+            product_id = product.id
+            product_objs[product_id] = product
+        quantities[product_id] = quantities.get(product_id, 0) + qty
+    missing_ids = quantities.keys() - product_objs.keys()
+    if missing_ids:
+        product_objs.update(shop_api.get_products(missing_ids))
+    products = [(product_objs.get(p), q) for p, q in quantities.items()]
+    # make sure that all the products exist
+    assert all(p is not None for p, q in products)
+
     if account_id is not None:
         account_obj = Account.objects.get(id=account_id)
     else:
         account_obj = None
 
-    purchase_obj = Purchase.objects.create(account=account_obj)
+    # The amount is computed here, so that the purchase is written once
+    # instead of once per item.
+    zero_money = Money(0, settings.DEFAULT_CURRENCY)
+    total_amount = sum((p.price * q for p, q in products), zero_money)
+    purchase_obj = Purchase(account=account_obj, amount=total_amount)
+    if purchase_id is not None:
+        purchase_obj.id = purchase_id
+    purchase_obj.save(force_insert=True)
+    if date_created is not None:
+        # The creation time is set on insert, so it is overridden afterwards.
+        Purchase.objects.filter(id=purchase_obj.id).update(
+            date_created=date_created
+        )
+        purchase_obj.date_created = date_created
     purchase_obj.states.create(status=enums.PurchaseStatus.PENDING)
 
-    products = [(shop_api.get_product(p), q) for p, q in products]
-    # make sure the quantites are greater than 0
-    assert all(q > 0 for _, q in products)
-    # make sure that all the products exist
-    assert all(p is not None for p, q in products)
-    items = []
-    for product_obj, qty in products:
-        trx_obj = PurchaseItem.objects.create(
+    # The items are bulk created, which skips the signal that would add
+    # them to the amount of the purchase again.
+    items = PurchaseItem.objects.bulk_create([
+        PurchaseItem(
             purchase=purchase_obj,
             product_id=product_obj.id,
             qty=qty,
             amount=product_obj.price
-        )
+        ) for product_obj, qty in products
+    ])
+    for trx_obj in items:
         shop_api.create_product_transaction(
-            product_id=product_obj.id,
+            product_id=trx_obj.product_id,
             trx_type=shop_enums.TrxType.PURCHASE,
-            qty=-qty,
+            qty=-trx_obj.qty,
             reference=trx_obj
         )
-        items.append(trx_obj)
-    zero_money = Money(0, settings.DEFAULT_CURRENCY)
-    total_amount = sum((p.price * q for p, q in products), zero_money)
     if account_id is not None:
         wallet_api.transfer(
             debtor_id=account_obj.id,
@@ -99,6 +135,60 @@ def create_purchase(account_id, products):
     return purchase_obj, items
 
 
+@transaction.atomic
+def create_purchases(purchases):
+    """Creates a batch of purchases, e.g. ones queued by an offline kiosk.
+
+    Each purchase is a dict with the keys `id`, `account_id`, `products` and
+    `date_created`, passed on to `create_purchase`. A purchase that already
+    exists is not created again, so a batch can be safely resent. A purchase
+    that fails does not affect the rest of the batch.
+
+    Returns a list of pairs of purchase ids and their results.
+    """
+    purchase_ids = [p['id'] for p in purchases]
+    existing_ids = set(Purchase.objects.filter(
+        id__in=purchase_ids
+    ).values_list('id', flat=True))
+    account_ids = {p['account_id'] for p in purchases} - {None}
+    account_ids = set(Account.objects.filter(
+        id__in=account_ids
+    ).values_list('id', flat=True))
+    product_objs = shop_api.get_products(
+        product_id for p in purchases for product_id, _ in p['products']
+    )
+    results = []
+    for purchase in purchases:
+        purchase_id = purchase['id']
+        account_id = purchase['account_id']
+        if purchase_id in existing_ids:
+            result = enums.PurchaseResult.DUPLICATE
+        elif account_id is not None and account_id not in account_ids:
+            result = enums.PurchaseResult.UNKNOWN_ACCOUNT
+        elif any(p not in product_objs for p, _ in purchase['products']):
+            result = enums.PurchaseResult.UNKNOWN_PRODUCT
+        else:
+            products = [(product_objs[p], q) for p, q in purchase['products']]
+            try:
+                with transaction.atomic():
+                    create_purchase(
+                        account_id=account_id,
+                        products=products,
+                        purchase_id=purchase_id,
+                        date_created=purchase['date_created']
+                    )
+                result = enums.PurchaseResult.CREATED
+                existing_ids.add(purchase_id)
+            except InsufficientFunds:
+                result = enums.PurchaseResult.INSUFFICIENT_FUNDS
+            except IntegrityError:
+                # The purchase has been created by a concurrent request.
+                result = enums.PurchaseResult.DUPLICATE
+                existing_ids.add(purchase_id)
+        results.append((purchase_id, result))
+    return results
+
+
 @transaction.atomic
 def finalize_purchase(purchase_id):
     purchase_obj = Purchase.objects.get(pk=purchase_id)
@@ -123,30 +213,65 @@ def finalize_purchase(purchase_id):
     return purchase_obj
 
 
-@transaction.atomic
 def cancel_purchase(purchase_id, force=False):
-    purchase_obj = Purchase.objects.get(id=purchase_id)
-    if not force and not purchase_obj.deletable:
-        raise NotCancelableException(_('The purchase cannot be canceled.'))
+    return cancel_purchases([purchase_id], force=force)[0]
 
-    purchase_obj.set_status(enums.PurchaseStatus.CANCELED)
-    # Cancel related shop item transactions
-    for item_trx_obj in purchase_obj.items.all():
-        trx_objs = shop_api.get_product_transactions_by_ref(item_trx_obj)
-        # Only one transaction with given reference should exist
-        assert len(trx_objs) == 1
-        shop_api.cancel_product_transaction(
-            trx_id=trx_objs[0].id,
-            reference=purchase_obj.account
+
+@transaction.atomic
+def cancel_purchases(purchase_ids, force=False):
+    """Cancels several purchases at once, e.g. a day of test purchases.
+
+    The same as calling `cancel_purchase` for every purchase, but done in a
+    fixed number of queries, however many purchases there are. Either all
+    the purchases are canceled or none of them.
+    """
+    purchase_objs = list(
+        Purchase.objects.filter(id__in=purchase_ids)
+        .select_related('account')
+        .with_current_status()
+    )
+    if len(purchase_objs) != len(set(purchase_ids)):
+        raise Purchase.DoesNotExist('Purchase matching query does not exist.')
+    if not force:
+        failed = sum(1 for p in purchase_objs if not p.deletable)
+        if failed and len(purchase_objs) == 1:
+            raise NotCancelableException(_('The purchase cannot be canceled.'))
+        elif failed:
+            raise NotCancelableException(
+                _('%d of the purchases cannot be canceled.') % failed
+            )
+    status_objs = []
+    for purchase_obj in purchase_objs:
+        current_status = purchase_obj.current_status
+        validate_transition(
+            enums.PurchaseStatus,
+            from_state=(enums.PurchaseStatus(current_status)
+                        if current_status is not None else None),
+            to_state=enums.PurchaseStatus.CANCELED
         )
+        status_objs.append(PurchaseStatus(
+            purchase=purchase_obj,
+            status=enums.PurchaseStatus.CANCELED
+        ))
+    PurchaseStatus.objects.bulk_create(status_objs)
+
+    # Cancel related shop item transactions
+    accounts = {p.id: p.account for p in purchase_objs}
+    shop_api.cancel_product_transactions_by_ref({
+        item_obj: accounts[item_obj.purchase_id]
+        for item_obj in PurchaseItem.objects.filter(purchase__in=purchase_objs)
+    })
     # Cancel related wallet transactions
-    trx_objs = wallet_api.get_transactions_by_ref(purchase_obj.id)
+    trx_ids = list(wallet_api.get_transactions_by_refs(
+        accounts
+    ).values_list('id', flat=True))
     # Exactly two transactions (withdrawal + deposit) with given reference
     # should exist for card payments. Only one for cash payments.
-    assert ((purchase_obj.account is not None and len(trx_objs) == 2) or
-            purchase_obj.account is None and len(trx_objs) == 1)
-    for trx_obj in trx_objs:
-        wallet_api.cancel_transaction(trx_obj.id)
+    assert len(trx_ids) == sum(
+        1 if account_obj is None else 2 for account_obj in accounts.values()
+    )
+    wallet_api.cancel_transactions(trx_ids)
+    return purchase_objs
 
 
 def update_purchase_status(purchase_id, status):
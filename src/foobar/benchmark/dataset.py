@@ -0,0 +1,19 @@
+from collections import namedtuple
+
+from shop.models import Product
+from ..models import Card
+
+Dataset = namedtuple('Dataset', ['card_numbers', 'product_ids'])
+
+
+def load_dataset():
+    """Returns the cards and the products the benchmark can use."""
+    return Dataset(
+        card_numbers=list(Card.objects.values_list('number', flat=True)),
+        product_ids=[
+            str(product_id) for product_id in Product.objects.filter(
+                active=True,
+                qty__gt=0
+            ).values_list('id', flat=True)
+        ]
+    )
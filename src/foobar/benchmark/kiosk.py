@@ -0,0 +1,124 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .stats import Recorder, summarize
+
+# What a kiosk does next is picked at random with these relative weights.
+SCENARIOS = (
+    ('card_sale', 6),
+    ('cash_sale', 3),
+    ('balance_check', 1),
+)
+
+# Maximum number of distinct products in a sale.
+MAX_SALE_PRODUCTS = 3
+
+# Timeout (in seconds) of a single request.
+REQUEST_TIMEOUT = 30
+
+
+class Kiosk:
+    """Simulates a kiosk selling products through the REST API.
+
+    The requests made by the kiosk are timed per endpoint. A failed request
+    is counted as an error and ends the scenario it was made in.
+    """
+
+    def __init__(self, url, token_key, dataset, rng=None):
+        self.url = url.rstrip('/')
+        self.dataset = dataset
+        self.rng = rng or random.Random()
+        self.recorder = Recorder()
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = 'Token {}'.format(token_key)
+
+    def request(self, endpoint, method, path, data=None):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                self.url + path,
+                json=data,
+                timeout=REQUEST_TIMEOUT
+            )
+        except requests.RequestException:
+            response = None
+        ok = response is not None and response.status_code < 400
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    def lookup_card(self):
+        card_number = self.rng.choice(self.dataset.card_numbers)
+        response = self.request(
+            'account',
+            'GET',
+            '/api/accounts/{}/'.format(card_number)
+        )
+        return response.json() if response is not None else None
+
+    def sell(self, account_id):
+        product_ids = self.rng.sample(
+            self.dataset.product_ids,
+            self.rng.randint(
+                1,
+                min(MAX_SALE_PRODUCTS, len(self.dataset.product_ids))
+            )
+        )
+        response = self.request('purchase_create', 'POST', '/api/purchases/', {
+            'account_id': account_id,
+            'products': [
+                {'id': product_id, 'qty': self.rng.randint(1, 2)}
+                for product_id in product_ids
+            ],
+        })
+        if response is None:
+            return
+        response = self.request(
+            'purchase_finalize',
+            'PATCH',
+            '/api/purchases/{}/'.format(response.json()['id']),
+            {'status': 'FINALIZED'}
+        )
+        if response is not None:
+            self.recorder.sales += 1
+
+    def card_sale(self):
+        account = self.lookup_card()
+        if account is not None:
+            self.sell(account['id'])
+
+    def cash_sale(self):
+        self.sell(None)
+
+    def balance_check(self):
+        self.lookup_card()
+
+    def run(self, deadline):
+        scenarios = [name for name, weight in SCENARIOS for _ in range(weight)]
+        while time.monotonic() < deadline:
+            getattr(self, self.rng.choice(scenarios))()
+        return self.recorder
+
+
+def run_kiosks(url, token_key, dataset, kiosks=4, duration=30, seed=None):
+    """Runs concurrent kiosks against the API for `duration` seconds.
+
+    Returns a report of the sales throughput and of the latencies per
+    endpoint. Given a seed, the kiosks make the same choices on every run.
+    """
+    rng = random.Random(seed)
+    kiosk_objs = [
+        Kiosk(url, token_key, dataset, rng=random.Random(rng.random()))
+        for _ in range(kiosks)
+    ]
+    start = time.monotonic()
+    deadline = start + duration
+    with ThreadPoolExecutor(max_workers=kiosks) as executor:
+        recorders = list(executor.map(
+            lambda kiosk: kiosk.run(deadline),
+            kiosk_objs
+        ))
+    return summarize(recorders, time.monotonic() - start)
@@ -0,0 +1,80 @@
+import random
+
+from django.db import transaction
+from moneyed import Money
+
+from shop.models import Product, ProductCategory
+from shop.tests.factories import ProductCategoryFactory, ProductFactory
+from wallet.enums import TrxStatus
+from wallet.models import Wallet, WalletTransaction, WalletTransactionStatus
+from wallet.tests.factories import (
+    WalletFactory,
+    WalletTrxFactory,
+    WalletTrxStatusFactory
+)
+from ..models import Account, Card
+from ..tests.factories import AccountFactory, CardFactory
+from .dataset import load_dataset
+
+# Quantity every seeded product is stocked with, so that the benchmark does
+# not run out of anything.
+SEED_PRODUCT_STOCK = 10 ** 6
+
+# Range (in SEK) of the seeded deposits, so that the wallets do not run out
+# of money either.
+SEED_DEPOSIT_RANGE = (10 ** 4, 10 ** 5)
+
+
+@transaction.atomic
+def seed_dataset(accounts=1000, products=200, categories=10, history=10,
+                 rng=None):
+    """Seeds the database with a dataset for the kiosk benchmark.
+
+    Every account gets a card and a wallet with `history` finalized
+    deposits. The objects are built with the factories (which come with the
+    test requirements) and inserted in bulk, so seeding thousands of
+    accounts takes seconds.
+    """
+    rng = rng or random.Random()
+    ProductCategoryFactory.reset_sequence(ProductCategory.objects.count())
+    category_objs = ProductCategoryFactory.build_batch(size=categories)
+    ProductCategory.objects.bulk_create(category_objs)
+    ProductFactory.reset_sequence(Product.objects.count())
+    Product.objects.bulk_create([
+        ProductFactory.build(
+            category=rng.choice(category_objs),
+            qty=SEED_PRODUCT_STOCK
+        ) for _ in range(products)
+    ])
+
+    account_objs = AccountFactory.build_batch(size=accounts, user=None)
+    Account.objects.bulk_create(account_objs)
+    Card.objects.bulk_create([
+        CardFactory.build(account=account_obj)
+        for account_obj in account_objs
+    ])
+
+    wallet_objs = []
+    trx_objs = []
+    for account_obj in account_objs:
+        amounts = [
+            Money(rng.randint(*SEED_DEPOSIT_RANGE), 'SEK')
+            for _ in range(history)
+        ]
+        wallet_obj = WalletFactory.build(
+            owner_id=str(account_obj.id),
+            balance=sum(amounts, Money(0, 'SEK'))
+        )
+        wallet_objs.append(wallet_obj)
+        trx_objs.extend(
+            WalletTrxFactory.build(wallet=wallet_obj, amount=amount)
+            for amount in amounts
+        )
+    Wallet.objects.bulk_create(wallet_objs)
+    WalletTransaction.objects.bulk_create(trx_objs)
+    WalletTransactionStatus.objects.bulk_create([
+        WalletTrxStatusFactory.build(trx=trx_obj, status=status)
+        for trx_obj in trx_objs
+        for status in (TrxStatus.PENDING, TrxStatus.FINALIZED)
+    ])
+    return load_dataset()
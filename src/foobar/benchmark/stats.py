@@ -0,0 +1,58 @@
+import math
+from collections import defaultdict
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Returns the p:th percentile of sorted values (nearest rank)."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Collects the latencies of the requests made by a single kiosk."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.sales = 0
+
+    def record(self, endpoint, latency, ok=True):
+        self.latencies[endpoint].append(latency)
+        if not ok:
+            self.errors[endpoint] += 1
+
+
+def summarize(recorders, elapsed):
+    """Merges the recordings of all the kiosks into a JSON-able report.
+
+    The latencies are reported in milliseconds.
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for recorder in recorders:
+        for endpoint, values in recorder.latencies.items():
+            latencies[endpoint].extend(values)
+        for endpoint, count in recorder.errors.items():
+            errors[endpoint] += count
+    endpoints = {}
+    for endpoint, values in sorted(latencies.items()):
+        values.sort()
+        summary = {
+            'requests': len(values),
+            'errors': errors[endpoint],
+            'throughput': len(values) / elapsed,
+        }
+        for p in PERCENTILES:
+            summary['p{}'.format(p)] = percentile(values, p) * 1000
+        endpoints[endpoint] = summary
+    sales = sum(recorder.sales for recorder in recorders)
+    return {
+        'elapsed': elapsed,
+        'sales': sales,
+        'sales_per_second': sales / elapsed,
+        'endpoints': endpoints,
+    }
@@ -16,6 +16,14 @@ class PurchaseStatus(enum.Enum):
         return [k for k in cls.__members__ if not k.startswith('_')]
 
 
+class PurchaseResult(enum.Enum):
+    CREATED = 0
+    DUPLICATE = 1
+    INSUFFICIENT_FUNDS = 2
+    UNKNOWN_ACCOUNT = 3
+    UNKNOWN_PRODUCT = 4
+
+
 class TrxType(enum.Enum):
     CORRECTION = 0
     DEPOSIT = 1
@@ -0,0 +1,62 @@
+from shop import api as shop_api
+from utils.exports import iterate_chunks
+
+PURCHASE_HEADER = (
+    'id', 'date_created', 'payment_method', 'account_id', 'status',
+    'product_id', 'product_name', 'qty', 'price', 'total', 'currency',
+)
+
+WALLET_LOG_ENTRY_HEADER = (
+    'id', 'date_created', 'user', 'owner_id', 'trx_type', 'comment',
+    'pre_balance', 'amount', 'post_balance', 'currency',
+)
+
+
+def purchase_rows(qs):
+    """Yields CSV rows of purchases, one row per purchased item."""
+    qs = qs.prefetch_related('items', 'states')
+    for chunk in iterate_chunks(qs):
+        product_objs = shop_api.get_products(
+            item_obj.product_id
+            for purchase_obj in chunk
+            for item_obj in purchase_obj.items.all()
+        )
+        for purchase_obj in chunk:
+            # The states are ordered from the newest one.
+            states = list(purchase_obj.states.all())
+            purchase = (
+                purchase_obj.id,
+                purchase_obj.date_created.isoformat(),
+                'cash' if purchase_obj.account_id is None else 'foocard',
+                purchase_obj.account_id or '',
+                states[0].status.name if states else '',
+            )
+            for item_obj in purchase_obj.items.all():
+                product_obj = product_objs.get(item_obj.product_id)
+                yield purchase + (
+                    item_obj.product_id,
+                    product_obj.name if product_obj is not None else '',
+                    item_obj.qty,
+                    item_obj.amount.amount,
+                    item_obj.total.amount,
+                    item_obj.amount.currency,
+                )
+
+
+def wallet_log_entry_rows(qs):
+    """Yields CSV rows of wallet log entries."""
+    qs = qs.select_related('user', 'wallet')
+    for chunk in iterate_chunks(qs):
+        for entry_obj in chunk:
+            yield (
+                entry_obj.id,
+                entry_obj.date_created.isoformat(),
+                entry_obj.user.username if entry_obj.user is not None else '',
+                entry_obj.wallet.owner_id,
+                entry_obj.trx_type.name,
+                entry_obj.comment or '',
+                entry_obj.pre_balance.amount,
+                entry_obj.amount.amount,
+                entry_obj.post_balance.amount,
+                entry_obj.amount.currency,
+            )
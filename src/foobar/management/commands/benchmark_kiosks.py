@@ -0,0 +1,89 @@
+import json
+import random
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from authtoken.models import Token
+from foobar.benchmark.kiosk import run_kiosks
+from foobar.benchmark.dataset import load_dataset
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Measures how many sales a running server sustains, by making '
+            'sales through the REST API from concurrent simulated kiosks. '
+            'Reports the throughput and the latencies per endpoint as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000',
+                            help='Base URL of the server to benchmark.')
+        parser.add_argument('--kiosks', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Number of seconds to run the kiosks for.')
+        parser.add_argument('--seed', action='store_true',
+                            help='Seed the database with a dataset first '
+                                 '(needs the test requirements).')
+        parser.add_argument('--accounts', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--history', type=int, default=10,
+                            help='Number of wallet transactions per account.')
+        parser.add_argument('--random-seed', type=int,
+                            help='Makes the seeding and the kiosks repeat.')
+        parser.add_argument('--output',
+                            help='File to write the report to.')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            from foobar.benchmark.seed import seed_dataset
+            dataset = seed_dataset(
+                accounts=options['accounts'],
+                products=options['products'],
+                history=options['history'],
+                rng=random.Random(options['random_seed'])
+            )
+        else:
+            dataset = load_dataset()
+        if not dataset.card_numbers or not dataset.product_ids:
+            raise CommandError('There are no cards or products to sell. '
+                               'Seed the database with --seed.')
+
+        # The token is committed, as the server has to see it.
+        token = Token()
+        for scope, _ in settings.API_TOKEN_SCOPES:
+            setattr(token.scopes, scope, True)
+        token.save()
+        try:
+            report = run_kiosks(
+                url=options['url'],
+                token_key=token.key,
+                dataset=dataset,
+                kiosks=options['kiosks'],
+                duration=options['duration'],
+                seed=options['random_seed']
+            )
+        finally:
+            token.delete()
+
+        report.update({
+            'commit': git_revision(),
+            'kiosks': options['kiosks'],
+            'duration': options['duration'],
+        })
+        content = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(content + '\n')
+        else:
+            self.stdout.write(content)
@@ -0,0 +1,49 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from foobar import exports
+from foobar.models import Purchase, WalletLogEntry
+from utils.exports import stream_csv
+from wallet import exports as wallet_exports
+from wallet.models import WalletTransaction
+
+EXPORTS = {
+    'purchases': (
+        Purchase, exports.PURCHASE_HEADER, exports.purchase_rows
+    ),
+    'wallet_transactions': (
+        WalletTransaction,
+        wallet_exports.TRANSACTION_HEADER,
+        wallet_exports.transaction_rows
+    ),
+    'wallet_log_entries': (
+        WalletLogEntry,
+        exports.WALLET_LOG_ENTRY_HEADER,
+        exports.wallet_log_entry_rows
+    ),
+}
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class Command(BaseCommand):
+    help = ('Exports purchases, wallet transactions or wallet log entries '
+            'created within a date range as CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS))
+        parser.add_argument('--start', type=parse_date,
+                            help='First day to export (YYYY-MM-DD).')
+        parser.add_argument('--end', type=parse_date,
+                            help='Last day to export (YYYY-MM-DD).')
+
+    def handle(self, *args, **options):
+        model, header, rows = EXPORTS[options['export']]
+        qs = model.objects.all()
+        if options['start'] is not None:
+            qs = qs.filter(date_created__date__gte=options['start'])
+        if options['end'] is not None:
+            qs = qs.filter(date_created__date__lte=options['end'])
+        for line in stream_csv(header, rows(qs)):
+            self.stdout.write(line, ending='')
@@ -1,6 +1,4 @@
-import requests
 from django.core.management.base import BaseCommand
-from django.core.files.uploadedfile import SimpleUploadedFile
 from shop import api as shop_api
 
 IMAGE_URL = ('http://www.narlivs.se/is-bin/intershop.static/WFS/'
@@ -12,11 +10,8 @@ class Command(BaseCommand):
     help = 'Imports product images from narlivs.se'
 
     def handle(self, *args, **options):
-        products = shop_api.list_products()
-        for product in products:
-            url = IMAGE_URL.format(ean=product.code)
-            response = requests.get(url)
-            if response.status_code == 200:
-                f = SimpleUploadedFile('tmp.jpg', response.content,
-                                       'image/jpeg')
-                shop_api.update_product(product.id, image=f)
+        result = shop_api.fetch_product_images(IMAGE_URL)
+        self.stdout.write(
+            'Updated {0.updated} images, {0.unchanged} unchanged, '
+            '{0.missing} missing, {0.failed} failed.'.format(result)
+        )
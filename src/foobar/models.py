@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connection, models
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
@@ -55,6 +55,27 @@ class Card(UUIDModel, TimeStampedModel):
         return 'Card {o.account}: {o.number}'.format(o=self)
 
 
+class PurchaseQuerySet(models.QuerySet):
+    def with_current_status(self):
+        # Select the latest status of every purchase as `current_status`,
+        # so that the statuses do not have to be queried per purchase.
+        qn = connection.ops.quote_name
+        states = qn(PurchaseStatus._meta.db_table)
+        sql = (
+            'SELECT {states}.{status} FROM {states} '
+            'WHERE {states}.{purchase_id} = {purchases}.{id} '
+            'ORDER BY {states}.{date_created} DESC LIMIT 1'
+        ).format(
+            states=states,
+            status=qn('status'),
+            purchase_id=qn('purchase_id'),
+            purchases=qn(self.model._meta.db_table),
+            id=qn('id'),
+            date_created=qn('date_created')
+        )
+        return self.extra(select={'current_status': sql})
+
+
 class Purchase(UUIDModel, TimeStampedModel):
     # account is None for cash payments
     account = models.ForeignKey(Account, related_name='purchases',
@@ -65,6 +86,8 @@ class Purchase(UUIDModel, TimeStampedModel):
         default_currency=settings.DEFAULT_CURRENCY
     )
 
+    objects = PurchaseQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date_created']
         permissions = (
@@ -95,7 +118,7 @@ class Purchase(UUIDModel, TimeStampedModel):
         return timezone.now() - self.date_created <= max_delta
 
     def payment_method(self):
-        return _('Cash') if self.account is None else _('FooCard')
+        return _('Cash') if self.account_id is None else _('FooCard')
 
     def __str__(self):
         return str(self.id)
@@ -1,6 +1,11 @@
 import decimal
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from django.utils import timezone
 from rest_framework import serializers
 from foobar.wallet import Money
+from shop import images
 
 
 class MoneyField(serializers.Field):
@@ -44,3 +49,64 @@ class IntEnumField(serializers.Field):
             return int(data)
         except ValueError:
             self.fail('not_a_number')
+
+
+class ThumbnailsField(serializers.Field):
+    """Represents an image as the URLs of its thumbnails, keyed by size."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(*args, **kwargs)
+
+    def to_representation(self, obj):
+        urls = images.thumbnail_urls(obj)
+        if urls is None:
+            return None
+        request = self.context.get('request')
+        if request is not None:
+            return OrderedDict(
+                (size, request.build_absolute_uri(url))
+                for size, url in urls.items()
+            )
+        return urls
+
+
+class CursorField(serializers.Field):
+    """Represents a point in time as an opaque cursor.
+
+    The cursor is the number of microseconds since the epoch, so it can be
+    passed in a URL as is.
+    """
+    default_error_messages = {
+        'invalid': 'Invalid cursor.'
+    }
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    def to_representation(self, obj):
+        return str((obj - self.epoch) // timedelta(microseconds=1))
+
+    def to_internal_value(self, data):
+        try:
+            return self.epoch + timedelta(microseconds=int(data))
+        except (TypeError, ValueError, OverflowError):
+            self.fail('invalid')
+
+
+class KeysetCursorField(CursorField):
+    """Represents the position of a row in a list ordered by creation time.
+
+    The cursor combines the creation time and the id of the row, as several
+    rows may be created at the same time.
+    """
+
+    def to_representation(self, obj):
+        date_created, id = obj
+        return '{}.{}'.format(super().to_representation(date_created), id.hex)
+
+    def to_internal_value(self, data):
+        try:
+            date_created, id = str(data).split('.')
+            id = uuid.UUID(id)
+        except ValueError:
+            self.fail('invalid')
+        return super().to_internal_value(date_created), id
@@ -0,0 +1,26 @@
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import serializers
+
+
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(
+        choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE']
+    )
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    max_requests = 20
+
+    atomic = serializers.BooleanField(default=False)
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > self.max_requests:
+            raise serializers.ValidationError(
+                _('At most {} requests can be sent at once.'.format(
+                    self.max_requests
+                ))
+            )
+        return value
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from ..fields import MoneyField
+from ..fields import CursorField, MoneyField, ThumbnailsField
 
 
 class ProductSerializer(serializers.Serializer):
@@ -8,6 +8,7 @@ class ProductSerializer(serializers.Serializer):
     code = serializers.CharField()
     description = serializers.CharField(allow_null=True)
     image = serializers.ImageField(allow_null=True)
+    thumbnails = ThumbnailsField(source='image')
     price = MoneyField(non_negative=True)
     category = serializers.UUIDField(read_only=True, source='category.id')
     active = serializers.BooleanField(default=False)
@@ -24,3 +25,16 @@ class ProductCategorySerializer(serializers.Serializer):
     id = serializers.UUIDField(read_only=True)
     name = serializers.CharField()
     image = serializers.ImageField(allow_null=True)
+    thumbnails = ThumbnailsField(source='image')
+
+
+class CatalogParamSerializer(serializers.Serializer):
+    since = CursorField()
+
+
+class CatalogChangesSerializer(serializers.Serializer):
+    cursor = CursorField(source='until')
+    products = ProductSerializer(many=True)
+    categories = ProductCategorySerializer(many=True)
+    deleted_products = serializers.ListField(child=serializers.UUIDField())
+    deleted_categories = serializers.ListField(child=serializers.UUIDField())
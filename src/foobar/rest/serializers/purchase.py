@@ -1,3 +1,5 @@
+import uuid
+from collections import OrderedDict
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 from utils.exceptions import InvalidTransition
@@ -12,31 +14,77 @@ class PurchaseRequestSerializer(serializers.Serializer):
     products = serializers.ListField(allow_empty=False)
 
     def validate_products(self, value):
+        quantities = OrderedDict()
         for product in value:
             if 'id' not in product or 'qty' not in product:
                 raise serializers.ValidationError(
                     _('Each product must contain "id" and "qty".')
                 )
-            product_obj = shop_api.get_product(product['id'])
-            if product_obj is None:
+            if product['qty'] <= 0:
+                raise serializers.ValidationError(
+                    _('Product quantity must be greater than 0.')
+                )
+            try:
+                product_id = uuid.UUID(str(product['id']))
+            except ValueError:
                 raise serializers.ValidationError(
                     _('Product with id "{}" not found.'.format(product['id']))
                 )
-            if product['qty'] <= 0:
+            qty = quantities.get(product_id, 0)
+            quantities[product_id] = qty + product['qty']
+        # resolve all the products at once
+        product_objs = shop_api.get_products(quantities.keys())
+        for product_id in quantities:
+            if product_id not in product_objs:
                 raise serializers.ValidationError(
-                    _('Product quantity must be greater than 0.')
+                    _('Product with id "{}" not found.'.format(product_id))
                 )
-        return value
+        return [(product_objs[p], q) for p, q in quantities.items()]
 
     def as_purchase_kwargs(self):
-        products = [(p['id'], p['qty'])
-                    for p in self.validated_data['products']]
         return {
             'account_id': self.validated_data['account_id'],
-            'products': products
+            'products': self.validated_data['products']
         }
 
 
+class PurchaseLineSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    qty = serializers.IntegerField(min_value=1)
+
+
+class OfflinePurchaseSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    account_id = serializers.UUIDField(allow_null=True)
+    date_created = serializers.DateTimeField()
+    products = PurchaseLineSerializer(many=True, allow_empty=False)
+
+    def validate_products(self, value):
+        return [(p['id'], p['qty']) for p in value]
+
+
+class BulkPurchaseRequestSerializer(serializers.Serializer):
+    # Purchases of a batch are created in a single transaction.
+    max_purchases = 500
+
+    purchases = OfflinePurchaseSerializer(many=True, allow_empty=False)
+
+    def validate_purchases(self, value):
+        if len(value) > self.max_purchases:
+            raise serializers.ValidationError(
+                _('At most {} purchases can be sent at once.'.format(
+                    self.max_purchases
+                ))
+            )
+        return value
+
+
+class PurchaseResultSerializer(serializers.Serializer):
+    def to_representation(self, instance):
+        purchase_id, result = instance
+        return {'id': str(purchase_id), 'result': result.name}
+
+
 class PurchaseItemSerializer(serializers.Serializer):
     qty = serializers.IntegerField()
     product_id = serializers.CharField()
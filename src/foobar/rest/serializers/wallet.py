@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from foobar.wallet import api as wallet_api
 
-from ..fields import MoneyField, IntEnumField
+from ..fields import MoneyField, IntEnumField, KeysetCursorField
 
 
 class WalletSerializer(serializers.Serializer):
@@ -27,6 +27,13 @@ class WalletTrxParamsSerializer(serializers.Serializer):
     owner_id = serializers.UUIDField()
 
 
+class WalletTrxListParamsSerializer(WalletTrxParamsSerializer):
+    limit = serializers.IntegerField(min_value=1, max_value=1000,
+                                     required=False)
+    cursor = KeysetCursorField(required=False)
+    stream = serializers.BooleanField(default=False)
+
+
 class WalletDepositSerializer(serializers.Serializer):
     owner_id = serializers.UUIDField()
     amount = MoneyField(non_negative=True)
@@ -4,6 +4,8 @@ from .views.wallet import WalletAPI, WalletTrxAPI
 from .views.product import ProductAPI, ProductCategoryAPI
 from .views.account import AccountAPI
 from .views.purchase import PurchaseAPI
+from .views.catalog import CatalogAPI
+from .views.batch import BatchAPI
 
 router = routers.DefaultRouter()
 router.register(r'wallets', WalletAPI, 'wallets')
@@ -12,5 +14,7 @@ router.register(r'products', ProductAPI, 'products')
 router.register(r'categories', ProductCategoryAPI, 'categories')
 router.register(r'accounts', AccountAPI, 'accounts')
 router.register(r'purchases', PurchaseAPI, 'purchases')
+router.register(r'catalog', CatalogAPI, 'catalog')
+router.register(r'batch', BatchAPI, 'batch')
 
 urlpatterns = tuple(router.urls)
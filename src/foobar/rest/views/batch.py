@@ -0,0 +1,174 @@
+import io
+import json
+import re
+from urllib.parse import urlsplit
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.urlresolvers import Resolver404, resolve
+from django.db import transaction
+from rest_framework import viewsets, status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from authtoken.permissions import HasToken
+
+from ..serializers.batch import BatchRequestSerializer
+
+# References to the data of an earlier response, e.g. `${0.id}` for the id
+# returned by the first sub-request.
+REFERENCE_RE = re.compile(r'\$\{(\d+)((?:\.\w+)+)\}')
+
+# Headers of the batch request that do not apply to its sub-requests.
+EXCLUDED_HEADERS = (
+    'HTTP_ACCEPT_ENCODING',
+    'HTTP_IF_MATCH',
+    'HTTP_IF_NONE_MATCH',
+    'HTTP_IF_MODIFIED_SINCE',
+    'HTTP_IF_UNMODIFIED_SINCE',
+)
+
+
+class InvalidReference(Exception):
+    pass
+
+
+def resolve_reference(match, responses):
+    index = int(match.group(1))
+    if index >= len(responses):
+        raise InvalidReference(match.group(0))
+    value = responses[index]['data']
+    for key in match.group(2)[1:].split('.'):
+        try:
+            value = value[int(key) if isinstance(value, list) else key]
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise InvalidReference(match.group(0))
+    return value
+
+
+def substitute_references(value, responses):
+    """Replaces the references in given value with the referenced data.
+
+    A string consisting of a single reference is replaced with the data as
+    is, otherwise the data is formatted into the string.
+    """
+    if isinstance(value, dict):
+        return {k: substitute_references(v, responses)
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [substitute_references(v, responses) for v in value]
+    if not isinstance(value, str):
+        return value
+    match = REFERENCE_RE.fullmatch(value)
+    if match is not None:
+        return resolve_reference(match, responses)
+    return REFERENCE_RE.sub(
+        lambda m: str(resolve_reference(m, responses)),
+        value
+    )
+
+
+def response_data(response):
+    if isinstance(response, Response):
+        return response.data
+    if response.streaming:
+        content = b''.join(response.streaming_content)
+    else:
+        content = response.content
+    if not content:
+        return None
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(content.decode())
+    return content.decode()
+
+
+class BatchAPI(viewsets.ViewSet):
+    """Executes a list of sub-requests against the API in a single request.
+
+    The sub-requests are executed in order on behalf of the token that made
+    the batch request, and their responses are returned in the same order.
+    A sub-request can refer to the data returned by an earlier one, e.g.
+    `/api/purchases/${1.id}/`.
+
+    If `atomic` is set, the sub-requests share a single transaction. The
+    batch then stops at the first failed sub-request and everything done by
+    the batch is rolled back.
+    """
+    permission_classes = (HasToken,)
+
+    def create(self, request):
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        subrequests = serializer.validated_data['requests']
+        if serializer.validated_data['atomic']:
+            with transaction.atomic():
+                responses = self.execute(request, subrequests, atomic=True)
+        else:
+            responses = self.execute(request, subrequests)
+        return Response(responses, status=status.HTTP_200_OK)
+
+    def execute(self, request, subrequests, atomic=False):
+        responses = []
+        for subrequest in subrequests:
+            try:
+                path = substitute_references(subrequest['path'], responses)
+                body = substitute_references(
+                    subrequest.get('body'),
+                    responses
+                )
+            except InvalidReference as e:
+                response = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'data': {'detail': 'Invalid reference: {}'.format(e)},
+                }
+            else:
+                response = self.execute_one(
+                    request,
+                    subrequest['method'],
+                    path,
+                    body
+                )
+            responses.append(response)
+            if atomic and response['status'] >= 400:
+                transaction.set_rollback(True)
+                break
+        return responses
+
+    def execute_one(self, request, method, path, body):
+        url = urlsplit(path)
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            match = None
+        if match is None or match.namespace != 'api':
+            return {
+                'status': status.HTTP_404_NOT_FOUND,
+                'data': {'detail': 'Not found.'},
+            }
+        if getattr(match.func, 'cls', None) is type(self):
+            return {
+                'status': status.HTTP_400_BAD_REQUEST,
+                'data': {'detail': 'Batch requests cannot be nested.'},
+            }
+        content = b''
+        if body is not None:
+            content = json.dumps(body, cls=JSONEncoder).encode()
+        environ = {
+            key: value for key, value in request.META.items()
+            if key not in EXCLUDED_HEADERS
+        }
+        environ.update({
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(content)),
+            'wsgi.input': io.BytesIO(content),
+        })
+        wsgi_request = WSGIRequest(environ)
+        # The batch request has already been authenticated.
+        wsgi_request._force_auth_user = request.user
+        wsgi_request._force_auth_token = request.auth
+        response = match.func(wsgi_request, *match.args, **match.kwargs)
+        return {
+            'status': response.status_code,
+            'data': response_data(response),
+        }
@@ -0,0 +1,90 @@
+import gzip
+import json
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import viewsets
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from authtoken.permissions import HasTokenScope
+
+import shop.api
+
+from ..fields import CursorField
+from ..serializers.product import (
+    CatalogChangesSerializer,
+    CatalogParamSerializer,
+    ProductSerializer,
+    ProductCategorySerializer
+)
+
+
+def build_snapshot(version):
+    """Returns the serialized catalog, both plain and gzip-compressed."""
+    key = 'catalog-snapshot:{}'.format(version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        data = {
+            'version': version,
+            'cursor': CursorField().to_representation(timezone.now()),
+            # Inactive products are reported as deleted by the changes, so
+            # they are left out of the snapshot too.
+            'products': ProductSerializer(
+                shop.api.list_products().active().select_related('category'),
+                many=True
+            ).data,
+            'categories': ProductCategorySerializer(
+                shop.api.list_categories(),
+                many=True
+            ).data,
+        }
+        body = json.dumps(data, cls=JSONEncoder).encode()
+        snapshot = (body, gzip.compress(body))
+        cache.set(key, snapshot)
+    return snapshot
+
+
+def parse_etags(header):
+    return [etag.strip().replace('W/', '', 1) for etag in header.split(',')]
+
+
+class CatalogAPI(viewsets.ViewSet):
+    """Provides all the products and categories in a single response.
+
+    The response carries the version of the catalog as its ETag, so polling
+    clients can send it back in `If-None-Match` and get an empty 304 response
+    as long as the catalog has not changed.
+
+    The response also carries a cursor. Passing it back as `since` returns
+    only the changes made to the catalog afterwards, together with the next
+    cursor.
+    """
+    permission_classes = (HasTokenScope('products'),)
+
+    def list(self, request):
+        if 'since' in request.GET:
+            return self.list_changes(request)
+        version = shop.api.get_catalog_version()
+        etag = '"{}"'.format(version)
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in etags or '*' in etags:
+            response = HttpResponse(status=304)
+        else:
+            body, gzipped_body = build_snapshot(version)
+            response = HttpResponse(content_type='application/json')
+            if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+                response.content = gzipped_body
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response.content = body
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    def list_changes(self, request):
+        serializer = CatalogParamSerializer(data=request.GET)
+        serializer.is_valid(raise_exception=True)
+        changes = shop.api.list_catalog_changes(**serializer.validated_data)
+        serializer = CatalogChangesSerializer(changes)
+        return Response(serializer.data)
@@ -1,4 +1,5 @@
 from rest_framework import viewsets, status
+from rest_framework.decorators import list_route
 from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from authtoken.permissions import HasTokenScope
@@ -6,6 +7,8 @@ from authtoken.permissions import HasTokenScope
 from foobar import api
 from ..serializers.account import AccountQuerySerializer
 from ..serializers.purchase import (
+    BulkPurchaseRequestSerializer,
+    PurchaseResultSerializer,
     PurchaseSerializer,
     PurchaseStatusSerializer,
     PurchaseRequestSerializer
@@ -41,6 +44,19 @@ class PurchaseAPI(viewsets.ViewSet):
         serializer = PurchaseSerializer(purchase_obj)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @list_route(methods=['POST'])
+    def bulk(self, request):
+        """Creates a batch of purchases made by a kiosk while offline.
+
+        The purchases carry ids and creation times set by the kiosk, so a
+        batch can be resent until its results are received.
+        """
+        serializer = BulkPurchaseRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = api.create_purchases(serializer.validated_data['purchases'])
+        serializer = PurchaseResultSerializer(results, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     def retrieve(self, request, pk):
         """Retrieves an existing purchase"""
         purchase_obj = api.get_purchase(pk)
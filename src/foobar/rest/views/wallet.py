@@ -1,14 +1,19 @@
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import detail_route
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
 from authtoken.permissions import HasTokenScope
 
 from foobar.wallet import api as wallet_api
 from wallet.exceptions import InsufficientFunds
 
+from ..fields import KeysetCursorField
 from ..serializers.wallet import (
     WalletSerializer,
     WalletTrxSerializer,
+    WalletTrxListParamsSerializer,
     WalletTrxParamsSerializer,
     WalletDepositSerializer,
     WalletWithdrawalSerializer,
@@ -77,11 +82,59 @@ class WalletAPI(viewsets.ViewSet):
 class WalletTrxAPI(viewsets.ViewSet):
     permission_classes = (HasTokenScope('wallet_trxs'),)
 
+    # Number of transactions in a page, unless `limit` is given.
+    page_size = 100
+
+    # Number of transactions fetched at a time when streaming.
+    stream_chunk_size = 500
+
     def list(self, request):
-        """Retrieves all the transactions for given wallet."""
-        serializer = WalletTrxParamsSerializer(data=request.GET)
+        """Retrieves the transactions for given wallet, newest first.
+
+        A page of `limit` transactions (100 by default) is returned and the
+        next page is linked in the `Link` header. If `stream` is set, all the
+        transactions are streamed instead, fetched a chunk at a time.
+        """
+        serializer = WalletTrxListParamsSerializer(data=request.GET)
         serializer.is_valid(raise_exception=True)
         owner_id = serializer.validated_data['owner_id']
-        trxs = wallet_api.list_transactions(owner_id)
+        limit = serializer.validated_data.get('limit', self.page_size)
+        after = serializer.validated_data.get('cursor')
+        if serializer.validated_data['stream']:
+            return StreamingHttpResponse(
+                self.stream(owner_id, after),
+                content_type='application/json'
+            )
+        trxs = list(wallet_api.list_transactions(
+            owner_id,
+            limit=limit,
+            after=after
+        ))
         serializer = WalletTrxSerializer(trxs, many=True)
-        return Response(serializer.data)
+        response = Response(serializer.data)
+        if len(trxs) == limit:
+            cursor = KeysetCursorField().to_representation(
+                (trxs[-1].date_created, trxs[-1].id)
+            )
+            url = replace_query_param(
+                request.build_absolute_uri(),
+                'cursor',
+                cursor
+            )
+            response['Link'] = '<{}>; rel="next"'.format(url)
+        return response
+
+    def stream(self, owner_id, after):
+        encoder = JSONEncoder()
+        yield '['
+        separator = ''
+        chunks = wallet_api.iterate_transactions(
+            owner_id,
+            chunk_size=self.stream_chunk_size,
+            after=after
+        )
+        for trxs in chunks:
+            for data in WalletTrxSerializer(trxs, many=True).data:
+                yield separator + encoder.encode(data)
+                separator = ','
+        yield ']'
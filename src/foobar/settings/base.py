@@ -139,6 +139,11 @@ STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'static'))
 MEDIA_URL = os.getenv('MEDIA_URL', '/media/')
 MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
 
+# Name product and category images after their content, so that their URLs
+# change with the content and can be served with far-future cache headers.
+CONTENT_HASHED_IMAGES = os.getenv('CONTENT_HASHED_IMAGES', '').lower() in \
+    ('1', 'true', 'yes')
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASS': (
         'rest_framework.permissions.IsAdminUser',
@@ -159,6 +164,10 @@ API_TOKEN_SCOPES = (
     ('wallets', 'Access to wallets'),
 )
 
+# Number of seconds an API token is cached in a process. A revoked token can
+# be used for at most this long by the other processes.
+API_TOKEN_CACHE_TTL = int(os.getenv('API_TOKEN_CACHE_TTL', 60))
+
 # Raven config
 RAVEN_CONFIG = {
     'dsn': os.getenv('SENTRY_DSN'),
@@ -186,6 +195,27 @@ THUNDERPUSH_PROTO = os.getenv('THUNDERPUSH_PROTO', 'http')
 NARLIVS_USERNAME = os.getenv('NARLIVS_USERNAME', '')
 NARLIVS_PASSWORD = os.getenv('NARLIVS_PASSWORD', '')
 
+# Maximum number of requests per second made to a supplier
+SUPPLIER_API_RATE_LIMITS = {
+    'narlivs': float(os.getenv('NARLIVS_RATE_LIMIT', 4)),
+}
+
+# Simulated round trip time (in seconds) of the fake supplier
+FAKE_SUPPLIER_LATENCY = float(os.getenv('FAKE_SUPPLIER_LATENCY', 0))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Parsed delivery reports, keyed by the content hash of the report file
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('REPORT_CACHE_DIR',
+                              os.path.join(BASE_DIR, 'cache', 'reports')),
+        'TIMEOUT': 60 * 60 * 24 * 30,
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -8,3 +8,8 @@ DATABASES = {
 }
 
 INSTALLED_APPS += ('shop.tests',)
+
+CACHES['reports'] = {  # noqa
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'reports',
+}
@@ -1,12 +1,19 @@
+from django.db.models import F
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from .. import models
 
 
 @receiver(post_save, sender=models.PurchaseItem)
-def update_wallet_balance(sender, instance, created, **kwargs):
+def update_purchase_amount(sender, instance, created, **kwargs):
     # Updating purchased items is not supported
     assert created
-    purchase_obj = instance.purchase
-    purchase_obj.amount += instance.qty * instance.amount
-    purchase_obj.save()
+    # The items of new purchases are created in bulk, with the amount of the
+    # purchase already computed, so this only covers items added later on.
+    # The amount is added in the database, so no concurrent additions are
+    # lost.
+    models.Purchase.objects.filter(id=instance.purchase_id).update(
+        amount=F('amount') + instance.qty * instance.amount.amount,
+        date_modified=timezone.now()
+    )
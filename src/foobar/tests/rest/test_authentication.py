@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+from rest_framework import exceptions
+
+from authtoken.authentication import TokenAuthentication, token_cache
+from authtoken.models import Token
+
+
+class TokenAuthenticationTest(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.token = Token()
+        self.token.scopes.products = True
+        self.token.save()
+        self.authentication = TokenAuthentication()
+
+    def test_cached(self):
+        with self.assertNumQueries(1):
+            _, token = self.authentication.authenticate_credentials(
+                self.token.key
+            )
+        self.assertTrue(token.scopes.products)
+        # Changing the token of a request does not affect the cached one.
+        token.scopes.products = False
+        with self.assertNumQueries(0):
+            _, token = self.authentication.authenticate_credentials(
+                self.token.key
+            )
+        self.assertTrue(token.scopes.products)
+        self.assertEqual(token.created, self.token.created)
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials('bacon')
+
+    def test_invalidate_on_save(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        token = Token.objects.get(key=self.token.key)
+        token.scopes.products = False
+        token.save()
+        with self.assertNumQueries(1):
+            _, token = self.authentication.authenticate_credentials(
+                self.token.key
+            )
+        self.assertFalse(token.scopes.products)
+
+    def test_invalidate_on_delete(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        Token.objects.get(key=self.token.key).delete()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    @mock.patch('authtoken.authentication.time.monotonic')
+    def test_expire(self, monotonic_mock):
+        monotonic_mock.return_value = 1000
+        with self.settings(API_TOKEN_CACHE_TTL=60):
+            self.authentication.authenticate_credentials(self.token.key)
+        # The token has been revoked by another process.
+        with mock.patch.object(token_cache, 'invalidate'):
+            Token.objects.filter(key=self.token.key).delete()
+        monotonic_mock.return_value = 1059
+        self.authentication.authenticate_credentials(self.token.key)
+        monotonic_mock.return_value = 1060
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_disabled(self):
+        with self.settings(API_TOKEN_CACHE_TTL=0), self.assertNumQueries(2):
+            self.authentication.authenticate_credentials(self.token.key)
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command('benchmark_token_auth', requests=10, stdout=out)
+        self.assertIn('Without cache', out.getvalue())
+        self.assertIn('With cache', out.getvalue())
+        self.assertEqual(Token.objects.count(), 1)
@@ -0,0 +1,124 @@
+from unittest import mock
+from django.conf import settings
+from django.core.urlresolvers import reverse_lazy as reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from authtoken.authentication import TokenAuthentication
+from authtoken.models import Token
+from shop.tests.factories import ProductFactory
+from wallet import enums as wallet_enums
+from wallet.tests.factories import WalletFactory, WalletTrxFactory
+from foobar import enums, models
+from ..factories import CardFactory
+from .base import AuthenticatedAPITestCase
+from moneyed import Money
+
+
+class TestBatchAPI(AuthenticatedAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        token_obj = Token()
+        for scope, _ in settings.API_TOKEN_SCOPES:
+            setattr(token_obj.scopes, scope, True)
+        token_obj.save()
+        self.api_client = APIClient(
+            HTTP_AUTHORIZATION='Token {}'.format(token_obj.key)
+        )
+        self.card_obj = CardFactory.create(number=1337)
+        wallet_obj = WalletFactory.create(owner_id=self.card_obj.account.id)
+        trx_obj = WalletTrxFactory.create(
+            wallet=wallet_obj,
+            amount=Money(100, 'SEK')
+        )
+        trx_obj.set_status(wallet_enums.TrxStatus.PENDING)
+        trx_obj.set_status(wallet_enums.TrxStatus.FINALIZED)
+        self.product_obj = ProductFactory.create(price=Money(30, 'SEK'))
+
+    def purchase_requests(self, qty=1):
+        return [
+            {
+                'method': 'GET',
+                'path': '/api/accounts/1337/',
+            },
+            {
+                'method': 'POST',
+                'path': '/api/purchases/',
+                'body': {
+                    'account_id': '${0.id}',
+                    'products': [{'id': str(self.product_obj.id), 'qty': qty}]
+                },
+            },
+            {
+                'method': 'PATCH',
+                'path': '/api/purchases/${1.id}/',
+                'body': {'status': 'FINALIZED'},
+            },
+        ]
+
+    def test_kiosk_flow(self):
+        url = reverse('api:batch-list')
+        data = {'requests': self.purchase_requests()}
+        authenticate = TokenAuthentication.authenticate
+        with mock.patch.object(TokenAuthentication, 'authenticate',
+                               autospec=True,
+                               side_effect=authenticate) as mock_auth:
+            response = self.api_client.post(url, data, format='json')
+        self.assertEqual(mock_auth.call_count, 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['status'] for r in response.data],
+            [status.HTTP_200_OK, status.HTTP_200_OK,
+             status.HTTP_204_NO_CONTENT]
+        )
+        self.assertEqual(
+            response.data[0]['data']['id'],
+            str(self.card_obj.account.id)
+        )
+        purchase_obj = models.Purchase.objects.get()
+        self.assertEqual(str(purchase_obj.id), response.data[1]['data']['id'])
+        self.assertEqual(purchase_obj.status, enums.PurchaseStatus.FINALIZED)
+
+    def test_atomic(self):
+        url = reverse('api:batch-list')
+        # The account cannot afford the purchase, so it is not finalized.
+        data = {'requests': self.purchase_requests(qty=4)}
+        response = self.api_client.post(url, data, format='json')
+        self.assertEqual(
+            [r['status'] for r in response.data],
+            [status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST,
+             status.HTTP_400_BAD_REQUEST]
+        )
+
+        data['requests'][2]['body'] = {'status': 'bacon'}
+        data['requests'][1]['body']['products'][0]['qty'] = 1
+        response = self.api_client.post(url, data, format='json')
+        self.assertEqual(response.data[2]['status'],
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(models.Purchase.objects.count(), 1)
+
+        # Everything is rolled back, once a sub-request fails.
+        data['atomic'] = True
+        response = self.api_client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(models.Purchase.objects.count(), 1)
+
+    def test_invalid_requests(self):
+        url = reverse('api:batch-list')
+        data = {
+            'requests': [
+                {'method': 'GET', 'path': '/admin/'},
+                {'method': 'POST', 'path': '/api/batch/'},
+                {'method': 'GET', 'path': '/api/accounts/${3.id}/'},
+            ]
+        }
+        response = self.api_client.post(url, data, format='json')
+        self.assertEqual(
+            [r['status'] for r in response.data],
+            [status.HTTP_404_NOT_FOUND, status.HTTP_400_BAD_REQUEST,
+             status.HTTP_400_BAD_REQUEST]
+        )
+
+        response = APIClient().post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,134 @@
+import gzip
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse_lazy as reverse
+from django.utils import timezone
+from rest_framework import status
+from shop.tests.factories import ProductFactory, ProductCategoryFactory
+from shop import api as shop_api, models as shop_models
+from .base import AuthenticatedAPITestCase
+
+
+class TestCatalogAPI(AuthenticatedAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.force_authenticate()
+        cache.clear()
+
+    def test_snapshot(self):
+        category_obj = ProductCategoryFactory.create()
+        ProductFactory.create(category=category_obj)
+        ProductFactory.create()
+        ProductFactory.create(active=False)
+        url = reverse('api:catalog-list')
+        response = self.api_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content.decode())
+        self.assertEqual(len(data['products']), 2)
+        self.assertEqual(len(data['categories']), 1)
+        self.assertEqual(response['ETag'], '"{}"'.format(data['version']))
+
+        # The catalog has not changed, so nothing needs to be serialized.
+        with self.assertNumQueries(2):
+            response = self.api_client.get(
+                url,
+                HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        # The serialized catalog is cached until the catalog changes.
+        with self.assertNumQueries(2):
+            response = self.api_client.get(url, HTTP_IF_NONE_MATCH='"bacon"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.api_client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(response.content).decode()
+        self.assertEqual(json.loads(content), data)
+
+    def test_version(self):
+        version = shop_api.get_catalog_version()
+        product_obj = ProductFactory.create()
+        self.assertNotEqual(shop_api.get_catalog_version(), version)
+        version = shop_api.get_catalog_version()
+        category_obj = ProductCategoryFactory.create()
+        self.assertNotEqual(shop_api.get_catalog_version(), version)
+        version = shop_api.get_catalog_version()
+        category_obj.name = 'Bacon'
+        category_obj.save()
+        self.assertNotEqual(shop_api.get_catalog_version(), version)
+        version = shop_api.get_catalog_version()
+        shop_api.apply_product_qty_deltas({product_obj.id: 5})
+        self.assertNotEqual(shop_api.get_catalog_version(), version)
+        version = shop_api.get_catalog_version()
+        product_obj.delete()
+        self.assertNotEqual(shop_api.get_catalog_version(), version)
+
+    def test_changes(self):
+        category_obj = ProductCategoryFactory.create()
+        product_obj1 = ProductFactory.create(category=category_obj)
+        product_obj2 = ProductFactory.create()
+        product_obj3 = ProductFactory.create()
+        ProductFactory.create()
+        # Make the catalog older than the overlap of the lookups.
+        date_modified = timezone.now() - timedelta(hours=1)
+        shop_models.Product.objects.update(date_modified=date_modified)
+        shop_models.ProductCategory.objects.update(
+            date_modified=date_modified
+        )
+        url = reverse('api:catalog-list')
+        response = self.api_client.get(url)
+        cursor = json.loads(response.content.decode())['cursor']
+
+        product_obj1.name = 'Bacon'
+        product_obj1.save()
+        product_obj2.active = False
+        product_obj2.save()
+        product_id3 = product_obj3.id
+        product_obj3.delete()
+        product_obj4 = ProductFactory.create()
+        with self.assertNumQueries(4):
+            response = self.api_client.get(url, {'since': cursor})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {p['id'] for p in response.data['products']},
+            {str(product_obj1.id), str(product_obj4.id)}
+        )
+        self.assertEqual(response.data['categories'], [])
+        self.assertEqual(
+            set(response.data['deleted_products']),
+            {str(product_obj2.id), str(product_id3)}
+        )
+        self.assertEqual(response.data['deleted_categories'], [])
+        self.assertGreater(response.data['cursor'], cursor)
+
+        # Deleting a category deletes its products too.
+        category_id = category_obj.id
+        product_id1 = product_obj1.id
+        category_obj.delete()
+        response = self.api_client.get(url, {'since': cursor})
+        self.assertEqual(
+            {p['id'] for p in response.data['products']},
+            {str(product_obj4.id)}
+        )
+        self.assertEqual(
+            response.data['deleted_categories'],
+            [str(category_id)]
+        )
+        self.assertIn(str(product_id1), response.data['deleted_products'])
+
+        cursor = response.data['cursor']
+        with mock.patch('shop.api.CATALOG_SYNC_OVERLAP', timedelta(0)):
+            response = self.api_client.get(url, {'since': cursor})
+        self.assertEqual(response.data['products'], [])
+        self.assertEqual(response.data['deleted_products'], [])
+
+    def test_changes_invalid_cursor(self):
+        url = reverse('api:catalog-list')
+        response = self.api_client.get(url, {'since': 'bacon'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -36,6 +36,7 @@ class TestProductAPI(AuthenticatedAPITestCase):
         response = self.api_client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['qty'], 10)
+        self.assertIsNone(response.data['thumbnails'])
         # retrieve a non-existent product
         url = reverse('api:products-detail', kwargs={'pk': uuid.uuid4()})
         response = self.api_client.get(url)
@@ -6,6 +6,7 @@ from shop.tests.factories import ProductFactory
 from wallet.tests.factories import WalletFactory, WalletTrxFactory
 from wallet import enums, api as wallet_api
 from foobar.rest.fields import MoneyField
+from foobar.rest.serializers.purchase import PurchaseRequestSerializer
 from foobar.enums import PurchaseStatus
 from ..factories import (
     AccountFactory,
@@ -108,6 +109,76 @@ class TestPurchaseAPI(AuthenticatedAPITestCase):
         response = self.api_client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_purchase_duplicate_products(self):
+        account_obj = AccountFactory.create()
+        wallet_obj = WalletFactory.create(owner_id=account_obj.id)
+        trx_obj = WalletTrxFactory.create(
+            wallet=wallet_obj,
+            amount=Money(1000, 'SEK')
+        )
+        trx_obj.set_status(enums.TrxStatus.PENDING)
+        trx_obj.set_status(enums.TrxStatus.FINALIZED)
+        product_obj1 = ProductFactory.create(price=Money(13, 'SEK'))
+        product_obj2 = ProductFactory.create(price=Money(30, 'SEK'))
+        data = {
+            'account_id': account_obj.id,
+            'products': [
+                {'id': product_obj1.id, 'qty': 1},
+                {'id': product_obj2.id, 'qty': 3},
+                {'id': product_obj1.id, 'qty': 2},
+            ]
+        }
+        serializer = PurchaseRequestSerializer(data=data)
+        # All the products are resolved with a single query.
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(
+            serializer.validated_data['products'],
+            [(product_obj1, 3), (product_obj2, 3)]
+        )
+
+        url = reverse('api:purchases-list')
+        response = self.api_client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['amount'], 129)
+        self.assertEqual(len(response.data['items']), 2)
+
+    def test_bulk_purchase(self):
+        product_obj = ProductFactory.create(price=Money(13, 'SEK'))
+        purchase_id = uuid.uuid4()
+        url = reverse('api:purchases-bulk')
+        data = {
+            'purchases': [
+                {
+                    'id': purchase_id,
+                    'account_id': None,
+                    'date_created': '2017-03-01T12:00:00Z',
+                    'products': [{'id': product_obj.id, 'qty': 2}],
+                },
+                {
+                    'id': uuid.uuid4(),
+                    'account_id': uuid.uuid4(),
+                    'date_created': '2017-03-01T12:01:00Z',
+                    'products': [{'id': product_obj.id, 'qty': 1}],
+                },
+            ]
+        }
+        response = self.api_client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'id': str(purchase_id), 'result': 'CREATED'},
+            {'id': str(data['purchases'][1]['id']),
+             'result': 'UNKNOWN_ACCOUNT'},
+        ])
+        response = self.api_client.post(url, data, format='json')
+        self.assertEqual(response.data[0]['result'], 'DUPLICATE')
+        product_obj.refresh_from_db()
+        self.assertEqual(product_obj.qty, -2)
+
+        data['purchases'][0]['products'][0]['qty'] = 0
+        response = self.api_client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_purchase_invalid_quantity(self):
         account_obj = AccountFactory.create()
         product_obj1 = ProductFactory.create()
@@ -134,6 +205,9 @@ class TestPurchaseAPI(AuthenticatedAPITestCase):
         }
         response = self.api_client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data['products'][0]['id'] = 'bacon'
+        response = self.api_client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_list_purchases(self):
         purchase_obj1 = PurchaseFactory.create()
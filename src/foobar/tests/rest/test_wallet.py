@@ -1,11 +1,15 @@
+import json
 import uuid
 from decimal import Decimal
+from unittest import mock
 from django.core.urlresolvers import reverse_lazy as reverse
 from rest_framework import status
 from wallet.tests.factories import WalletFactory, WalletTrxFactory
 from wallet import enums
+from wallet.models import Wallet
 from foobar.wallet import Money
 from foobar.rest.fields import MoneyField
+from foobar.rest.views.wallet import WalletTrxAPI
 from .base import AuthenticatedAPITestCase
 
 
@@ -135,3 +139,55 @@ class TestWalletTrxAPI(AuthenticatedAPITestCase):
         # no owner_id supplied
         response = self.api_client.get(url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_pages(self):
+        wallet_obj = WalletFactory.create()
+        for _ in range(3):
+            trx_obj = WalletTrxFactory(wallet=wallet_obj, amount=Money(100))
+            trx_obj.set_status(enums.TrxStatus.PENDING)
+        url = reverse('api:wallet_trxs-list')
+        data = {'owner_id': wallet_obj.owner_id, 'limit': 2}
+        response = self.api_client.get(url, data=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        next_url = response['Link'].split(';')[0].strip('<>')
+        response = self.api_client.get(next_url)
+        self.assertEqual(len(response.data), 1)
+        self.assertNotIn('Link', response)
+
+        data['cursor'] = 'bacon'
+        response = self.api_client.get(url, data=data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Without a limit, a page of the default size is returned.
+        with mock.patch.object(WalletTrxAPI, 'page_size', 2):
+            response = self.api_client.get(url, data={
+                'owner_id': wallet_obj.owner_id
+            })
+        self.assertEqual(len(response.data), 2)
+        self.assertIn('Link', response)
+
+    def test_list_stream(self):
+        wallet_obj = WalletFactory.create()
+        for _ in range(5):
+            trx_obj = WalletTrxFactory(wallet=wallet_obj, amount=Money(100))
+            trx_obj.set_status(enums.TrxStatus.PENDING)
+        url = reverse('api:wallet_trxs-list')
+        data = {'owner_id': wallet_obj.owner_id}
+        expected = self.api_client.get(url, data=data).data
+        data['stream'] = 'true'
+        with mock.patch.object(WalletTrxAPI, 'stream_chunk_size', 2):
+            response = self.api_client.get(url, data=data)
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(content.decode()), expected)
+
+        # Streaming the transactions of an unknown owner does not create
+        # a wallet for them.
+        data['owner_id'] = uuid.uuid4()
+        response = self.api_client.get(url, data=data)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(json.loads(content.decode()), [])
+        self.assertFalse(
+            Wallet.objects.filter(owner_id=data['owner_id']).exists()
+        )
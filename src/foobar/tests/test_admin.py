@@ -1,8 +1,22 @@
+import csv
+import io
+from unittest import mock
 from django.apps import apps
 from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from moneyed import Money
+from shop.tests.factories import ProductFactory
+from wallet import enums as wallet_enums
+from wallet.models import Wallet
+from wallet.tests.factories import WalletFactory, WalletTrxFactory
+from foobar import api, enums, models
+from foobar.wallet import api as wallet_api
+from .factories import AccountFactory, PurchaseFactory, PurchaseItemFactory
 
 
 class TestAdminViews(TestCase):
@@ -42,3 +56,223 @@ class TestAdminViews(TestCase):
                     ))
                     response = self.client.get(url)
                     self.assertEqual(response.status_code, 200)
+
+
+class TestAccountAdmin(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_superuser(
+            username='bananaman',
+            email='donkey@kong.com',
+            password='hunter2',
+        )
+        self.client.force_login(self.user)
+
+    def test_changelist(self):
+        account_objs = AccountFactory.create_batch(size=5)
+        for i, account_obj in enumerate(account_objs[:3]):
+            wallet_api.set_balance(account_obj.id, Money(10 * i, 'SEK'))
+        url = reverse('admin:foobar_account_changelist')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        wallet_count = Wallet.objects.count()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        AccountFactory.create_batch(size=5)
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Viewing the accounts does not create any wallets.
+        self.assertEqual(Wallet.objects.count(), wallet_count)
+
+        # The accounts can be sorted by the balance.
+        index = response.context['cl'].list_display.index('balance')
+        response = self.client.get(url, {'o': '-{}'.format(index)})
+        result_list = response.context['cl'].result_list
+        self.assertEqual(
+            [a.id for a in result_list[:3]],
+            [a.id for a in reversed(account_objs[:3])]
+        )
+        self.assertEqual(
+            response.context['cl'].model_admin.balance(result_list[0]),
+            Money(20, 'SEK')
+        )
+
+        url = reverse(
+            'admin:foobar_account_change',
+            args=(account_objs[4].id,)
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Wallet.objects.count(), wallet_count)
+
+
+class TestPurchaseAdmin(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_superuser(
+            username='bananaman',
+            email='donkey@kong.com',
+            password='hunter2',
+        )
+        self.client.force_login(self.user)
+
+    def test_changelist(self):
+        account_obj = AccountFactory.create()
+        purchase_objs = PurchaseFactory.create_batch(size=50, account=None)
+        purchase_objs += PurchaseFactory.create_batch(
+            size=50,
+            account=account_obj
+        )
+        for purchase_obj in purchase_objs[:50]:
+            purchase_obj.states.create(status=enums.PurchaseStatus.PENDING)
+        purchase_objs[0].set_status(enums.PurchaseStatus.FINALIZED)
+        url = reverse('admin:foobar_purchase_changelist')
+        self.client.get(url)
+        with self.assertNumQueries(11):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        result_list = response.context['cl'].result_list
+        self.assertEqual(len(result_list), 100)
+        model_admin = response.context['cl'].model_admin
+        statuses = {p.id: model_admin.status(p) for p in result_list}
+        self.assertEqual(
+            statuses[purchase_objs[0].id],
+            enums.PurchaseStatus.FINALIZED
+        )
+        self.assertEqual(
+            statuses[purchase_objs[1].id],
+            enums.PurchaseStatus.PENDING
+        )
+        self.assertIsNone(statuses[purchase_objs[99].id])
+
+    def test_change(self):
+        purchase_obj = PurchaseFactory.create()
+        purchase_obj.states.create(status=enums.PurchaseStatus.PENDING)
+        product_objs = ProductFactory.create_batch(size=50)
+        for product_obj in product_objs:
+            PurchaseItemFactory.create(
+                purchase=purchase_obj,
+                product_id=product_obj.id
+            )
+        url = reverse('admin:foobar_purchase_change', args=(purchase_obj.id,))
+        self.client.get(url)
+        with self.assertNumQueries(13):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, product_objs[49].code)
+
+    def test_cancel_purchases(self):
+        product_obj = ProductFactory.create(price=Money(10, 'SEK'))
+        purchase_objs = [
+            api.create_purchase(None, [(product_obj.id, 1)])[0]
+            for _ in range(5)
+        ]
+        url = reverse('admin:foobar_purchase_changelist')
+        data = {
+            'action': 'cancel_purchases',
+            '_selected_action': [str(p.id) for p in purchase_objs],
+        }
+        response = self.client.post(url, data, follow=True)
+        self.assertContains(response, 'Canceled 5 purchase(s).')
+        for purchase_obj in purchase_objs:
+            self.assertEqual(purchase_obj.status,
+                             enums.PurchaseStatus.CANCELED)
+        product_obj.refresh_from_db()
+        self.assertEqual(product_obj.qty, 0)
+
+        # Nothing is canceled twice.
+        response = self.client.post(url, data, follow=True)
+        self.assertContains(response, 'Canceled 0 purchase(s) (5 failed).')
+        self.assertEqual(models.PurchaseStatus.objects.count(), 10)
+
+        # The purchases that cannot be canceled do not block the others.
+        purchase_obj = api.create_purchase(None, [(product_obj.id, 1)])[0]
+        data['_selected_action'].append(str(purchase_obj.id))
+        response = self.client.post(url, data, follow=True)
+        self.assertContains(response, 'Canceled 1 purchase(s) (5 failed).')
+        self.assertEqual(purchase_obj.status, enums.PurchaseStatus.CANCELED)
+
+
+class TestExports(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_superuser(
+            username='bananaman',
+            email='donkey@kong.com',
+            password='hunter2',
+        )
+        self.client.force_login(self.user)
+
+    def export(self, model, ids):
+        url = reverse('admin:{}_{}_changelist'.format(
+            model._meta.app_label,
+            model._meta.model_name
+        ))
+        response = self.client.post(url, {
+            'action': 'export_csv',
+            '_selected_action': [str(i) for i in ids],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_export_purchases(self):
+        product_obj = ProductFactory.create(name='Bacon')
+        item_objs = [
+            PurchaseItemFactory.create(product_id=product_obj.id, qty=2)
+            for _ in range(3)
+        ]
+        PurchaseItemFactory.create(purchase=item_objs[0].purchase)
+        ids = [item_obj.purchase.id for item_obj in item_objs]
+        with mock.patch('utils.exports.EXPORT_CHUNK_SIZE', 2):
+            rows = self.export(models.Purchase, ids)
+        self.assertEqual(rows[0][:3], ['id', 'date_created', 'payment_method'])
+        self.assertEqual(len(rows), 5)
+        row = next(r for r in rows if r[0] == str(ids[1]))
+        self.assertEqual(row[5:8], [str(product_obj.id), 'Bacon', '2'])
+
+    def test_export_wallet_transactions(self):
+        wallet_obj = WalletFactory.create()
+        trx_obj = WalletTrxFactory.create(
+            wallet=wallet_obj,
+            amount=Money(10, 'SEK')
+        )
+        trx_obj.set_status(wallet_enums.TrxStatus.PENDING)
+        trx_obj.set_status(wallet_enums.TrxStatus.FINALIZED)
+        rows = self.export(trx_obj.__class__, [trx_obj.id])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][2], wallet_obj.owner_id)
+        self.assertEqual(rows[1][-1], 'FINALIZED')
+
+    def test_export_wallet_log_entries(self):
+        wallet_obj = WalletFactory.create()
+        entry_objs = [
+            models.WalletLogEntry.objects.create(
+                user=self.user,
+                wallet=wallet_obj,
+                amount=Money(10, 'SEK'),
+                pre_balance=Money(5, 'SEK')
+            ) for _ in range(3)
+        ]
+        ids = [entry_obj.id for entry_obj in entry_objs]
+        with mock.patch('utils.exports.EXPORT_CHUNK_SIZE', 2):
+            rows = self.export(models.WalletLogEntry, ids)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row[0] for row in rows[1:]}, set(map(str, ids)))
+        self.assertEqual(rows[1][2], 'bananaman')
+        self.assertEqual(rows[1][-2:], ['15.00', 'SEK'])
+
+    def test_export_command(self):
+        PurchaseItemFactory.create_batch(size=3)
+        out = io.StringIO()
+        call_command('export_csv', 'purchases', '--start', '2000-01-01',
+                     stdout=out)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 4)
+        out = io.StringIO()
+        call_command('export_csv', 'purchases', '--end', '2000-01-01',
+                     stdout=out)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 1)
@@ -1,7 +1,11 @@
+from datetime import timedelta
 from unittest import mock
 import uuid
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.conf import settings
+from django.utils import timezone
 from foobar import api, enums, models
 from foobar.wallet import api as wallet_api
 from utils.exceptions import InvalidTransition
@@ -178,6 +182,74 @@ class FoobarAPITest(TestCase):
         _, balance = wallet_api.get_balance(settings.FOOBAR_CASH_WALLET)
         self.assertEqual(balance, Money(0, 'SEK'))
 
+    def test_cancel_purchases(self):
+        account_obj = AccountFactory.create()
+        wallet_obj = WalletFactory.create(owner_id=account_obj.id)
+        trx_obj = WalletTrxFactory.create(
+            wallet=wallet_obj,
+            amount=Money(1000, 'SEK')
+        )
+        trx_obj.set_status(wallet_enums.TrxStatus.PENDING)
+        trx_obj.set_status(wallet_enums.TrxStatus.FINALIZED)
+        product_obj1 = ProductFactory.create(price=Money(13, 'SEK'))
+        product_obj2 = ProductFactory.create(price=Money(30, 'SEK'))
+        products = [(product_obj1.id, 2), (product_obj2.id, 1)]
+        purchase_ids = []
+        for i in range(10):
+            purchase_obj, _ = api.create_purchase(account_obj.id, products)
+            if i % 2:
+                api.finalize_purchase(purchase_obj.id)
+            purchase_ids.append(purchase_obj.id)
+        for i in range(10):
+            purchase_obj, _ = api.create_purchase(None, products)
+            purchase_ids.append(purchase_obj.id)
+
+        # Nothing is canceled, if any of the purchases cannot be canceled.
+        old_purchase_obj, _ = api.create_purchase(None, products)
+        models.Purchase.objects.filter(id=old_purchase_obj.id).update(
+            date_created=timezone.now() - timedelta(days=1)
+        )
+        with self.assertRaises(api.NotCancelableException):
+            api.cancel_purchases(purchase_ids + [old_purchase_obj.id])
+        self.assertEqual(
+            models.PurchaseStatus.objects.filter(
+                status=enums.PurchaseStatus.CANCELED
+            ).count(),
+            0
+        )
+
+        # The number of queries does not depend on the number of purchases.
+        with self.assertNumQueries(18):
+            api.cancel_purchases(purchase_ids)
+        for purchase_id in purchase_ids:
+            purchase_obj, _ = api.get_purchase(purchase_id)
+            self.assertEqual(purchase_obj.status,
+                             enums.PurchaseStatus.CANCELED)
+        product_obj1.refresh_from_db()
+        product_obj2.refresh_from_db()
+        self.assertEqual(product_obj1.qty, -2)
+        self.assertEqual(product_obj2.qty, -1)
+        _, balance = wallet_api.get_balance(account_obj.id)
+        self.assertEqual(balance, Money(1000, 'SEK'))
+        _, balance = wallet_api.get_balance(settings.FOOBAR_MAIN_WALLET)
+        self.assertEqual(balance, Money(0, 'SEK'))
+        # The cached balances agree with the transactions.
+        for owner_id in (account_obj.id, settings.FOOBAR_MAIN_WALLET,
+                         settings.FOOBAR_CASH_WALLET):
+            self.assertEqual(
+                wallet_api.get_balance(owner_id),
+                wallet_api.get_balance(owner_id, cached=False)
+            )
+
+        # Canceled purchases cannot be canceled again.
+        with self.assertRaises(InvalidTransition):
+            api.cancel_purchases(purchase_ids[:1])
+
+        # Old purchases can be canceled by force.
+        api.cancel_purchases([old_purchase_obj.id], force=True)
+        product_obj1.refresh_from_db()
+        self.assertEqual(product_obj1.qty, 0)
+
     def test_cash_purchase(self):
         product_obj1 = ProductFactory.create(
             code='1337733113370',
@@ -208,6 +280,117 @@ class FoobarAPITest(TestCase):
         _, balance = wallet_api.get_balance(settings.FOOBAR_CASH_WALLET)
         self.assertEqual(balance, Money(69, 'SEK'))
 
+    def test_purchase_amount(self):
+        product_objs = ProductFactory.create_batch(
+            size=10,
+            price=Money(5, 'SEK')
+        )
+        products = [(p.id, 2) for p in product_objs]
+        with CaptureQueriesContext(connection) as ctx:
+            purchase_obj, _ = api.create_purchase(None, products)
+        # The purchase is written once, however many items it has.
+        table = models.Purchase._meta.db_table
+        writes = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith((
+                'INSERT INTO "{}"'.format(table),
+                'UPDATE "{}"'.format(table)
+            ))
+        ]
+        self.assertEqual(len(writes), 1)
+        purchase_obj.refresh_from_db()
+        self.assertEqual(purchase_obj.amount, Money(100, 'SEK'))
+
+        # Items added afterwards are added to the amount.
+        PurchaseItemFactory.create(
+            purchase=purchase_obj,
+            qty=3,
+            amount=Money(7, 'SEK')
+        )
+        purchase_obj.refresh_from_db()
+        self.assertEqual(purchase_obj.amount, Money(121, 'SEK'))
+
+    def test_purchase_resolved_products(self):
+        product_obj1 = ProductFactory.create(price=Money(13, 'SEK'))
+        product_obj2 = ProductFactory.create(price=Money(30, 'SEK'))
+        products = [
+            (product_obj1, 1),
+            (str(product_obj2.id), 1),
+            (product_obj1.id, 2),
+        ]
+        purchase_obj, items = api.create_purchase(None, products)
+        self.assertEqual(purchase_obj.amount, Money(69, 'SEK'))
+        self.assertEqual(
+            [(i.product_id, i.qty) for i in items],
+            [(product_obj1.id, 3), (product_obj2.id, 1)]
+        )
+        product_obj1.refresh_from_db()
+        self.assertEqual(product_obj1.qty, -3)
+
+    def test_create_purchases(self):
+        account_obj1 = AccountFactory.create()
+        wallet_obj = WalletFactory.create(owner_id=account_obj1.id)
+        trx_obj = WalletTrxFactory.create(
+            wallet=wallet_obj,
+            amount=Money(50, 'SEK')
+        )
+        trx_obj.set_status(wallet_enums.TrxStatus.PENDING)
+        trx_obj.set_status(wallet_enums.TrxStatus.FINALIZED)
+        account_obj2 = AccountFactory.create()
+        product_obj = ProductFactory.create(price=Money(30, 'SEK'))
+        date_created = timezone.now() - timedelta(hours=1)
+
+        def purchase(account_id=None, product_id=product_obj.id):
+            return {
+                'id': uuid.uuid4(),
+                'account_id': account_id,
+                'date_created': date_created,
+                'products': [(product_id, 1)],
+            }
+        purchases = [
+            purchase(),
+            purchase(account_obj1.id),
+            purchase(account_obj2.id),
+            purchase(uuid.uuid4()),
+            purchase(product_id=uuid.uuid4()),
+        ]
+        results = api.create_purchases(purchases)
+        self.assertEqual(results, [
+            (purchases[0]['id'], enums.PurchaseResult.CREATED),
+            (purchases[1]['id'], enums.PurchaseResult.CREATED),
+            (purchases[2]['id'], enums.PurchaseResult.INSUFFICIENT_FUNDS),
+            (purchases[3]['id'], enums.PurchaseResult.UNKNOWN_ACCOUNT),
+            (purchases[4]['id'], enums.PurchaseResult.UNKNOWN_PRODUCT),
+        ])
+        purchase_obj, _ = api.get_purchase(purchases[1]['id'])
+        self.assertEqual(purchase_obj.date_created, date_created)
+        self.assertEqual(purchase_obj.amount, Money(30, 'SEK'))
+        self.assertEqual(models.Purchase.objects.count(), 2)
+
+        # Resending the batch does not create the purchases again.
+        results = api.create_purchases(purchases[:3])
+        self.assertEqual(
+            [r for _, r in results],
+            [enums.PurchaseResult.DUPLICATE,
+             enums.PurchaseResult.DUPLICATE,
+             enums.PurchaseResult.INSUFFICIENT_FUNDS]
+        )
+        self.assertEqual(models.Purchase.objects.count(), 2)
+        product_obj.refresh_from_db()
+        self.assertEqual(product_obj.qty, -2)
+
+        # A rejected purchase can be retried as cash in the same batch.
+        results = api.create_purchases([
+            purchases[2],
+            dict(purchases[2], account_id=None),
+        ])
+        self.assertEqual(
+            [r for _, r in results],
+            [enums.PurchaseResult.INSUFFICIENT_FUNDS,
+             enums.PurchaseResult.CREATED]
+        )
+        self.assertEqual(models.Purchase.objects.count(), 3)
+
     def test_get_purchase(self):
         account_obj = AccountFactory.create()
         wallet_obj = WalletFactory.create(owner_id=account_obj.id)
@@ -0,0 +1,46 @@
+import json
+from io import StringIO
+from django.core.management import call_command
+from django.test import LiveServerTestCase
+from authtoken.models import Token
+from foobar import enums, models
+from foobar.benchmark.stats import percentile
+
+
+class KioskBenchmarkTest(LiveServerTestCase):
+    def test_benchmark(self):
+        out = StringIO()
+        call_command(
+            'benchmark_kiosks',
+            url=self.live_server_url,
+            kiosks=1,
+            duration=1,
+            seed=True,
+            accounts=5,
+            products=5,
+            history=2,
+            random_seed=1337,
+            stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(models.Card.objects.count(), 5)
+        self.assertGreater(report['sales'], 0)
+        self.assertEqual(
+            report['sales'],
+            models.Purchase.objects.filter(
+                states__status=enums.PurchaseStatus.FINALIZED
+            ).count()
+        )
+        for endpoint in ('account', 'purchase_create', 'purchase_finalize'):
+            summary = report['endpoints'][endpoint]
+            self.assertEqual(summary['errors'], 0)
+            self.assertLessEqual(summary['p50'], summary['p99'])
+        # The token of the benchmark is removed afterwards.
+        self.assertEqual(Token.objects.count(), 0)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
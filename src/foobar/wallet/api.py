@@ -9,11 +9,15 @@ get_wallet = partial(api.get_wallet, currency=DEFAULT_CURRENCY)
 get_balance = partial(api.get_balance, currency=DEFAULT_CURRENCY)
 set_balance = api.set_balance
 list_transactions = partial(api.list_transactions, currency=DEFAULT_CURRENCY)
+iterate_transactions = partial(api.iterate_transactions,
+                               currency=DEFAULT_CURRENCY)
 total_balance = partial(api.total_balance, currency=DEFAULT_CURRENCY)
 withdraw = api.withdraw
 deposit = api.deposit
 transfer = api.transfer
 get_transactions_by_ref = api.get_transactions_by_ref
+get_transactions_by_refs = api.get_transactions_by_refs
 cancel_transaction = api.cancel_transaction
+cancel_transactions = api.cancel_transactions
 finalize_transaction = api.finalize_transaction
 finalize_transactions = api.finalize_transactions
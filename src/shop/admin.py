@@ -1,12 +1,15 @@
 import tempfile
 from datetime import date
+import requests
 from django import forms
 from django.shortcuts import get_object_or_404
 from django.contrib import admin, messages
 from django.http import HttpResponseRedirect, Http404
 from django.conf.urls import url
 from django.core.urlresolvers import reverse
+from django.utils.html import format_html
 from django.utils.translation import ugettext_lazy as _
+from utils.admin import html_table
 from .suppliers.base import SupplierAPIException
 from . import models, api, exceptions
 
@@ -151,7 +154,7 @@ class StocktakeChunkInline(ReadonlyMixin, admin.TabularInline):
 
 @admin.register(models.Stocktake)
 class StocktakeAdmin(ReadonlyMixin, admin.ModelAdmin):
-    list_display = ('id', 'locked', 'date_created',)
+    list_display = ('id', 'locked', 'progress', 'date_created',)
     fields = ('id', 'locked', 'progress',)
     readonly_fields = ('id', 'locked', 'progress',)
     inlines = [StocktakeChunkInline]
@@ -164,6 +167,10 @@ class StocktakeAdmin(ReadonlyMixin, admin.ModelAdmin):
         if obj:
             return '{0:.0f}%'.format(obj.progress * 100)
 
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.with_progress()
+
     def response_change(self, request, obj):
         if '_finalize' in request.POST:
             api.finalize_stocktaking(obj.id)
@@ -330,6 +337,7 @@ class DeliveryItemInline(admin.TabularInline):
 
 class DeliveryForm(forms.ModelForm):
     """Implements custom validation for the Delivery admin."""
+    supplier_products = None
 
     def clean(self):
         supplier = self.cleaned_data.get('supplier')
@@ -340,6 +348,7 @@ class DeliveryForm(forms.ModelForm):
                 # Save it to a temporary file, then try to parse it.
                 with tempfile.NamedTemporaryFile() as f:
                     f.write(report.read())
+                    f.flush()
                     items = api.parse_report(supplier.internal_name, f.name)
             except SupplierAPIException as e:
                 raise forms.ValidationError(
@@ -349,6 +358,22 @@ class DeliveryForm(forms.ModelForm):
                 raise forms.ValidationError(
                     _('No products could be imported from the report file.')
                 )
+            if self.instance._state.adding:
+                # Retrieve the unknown products before the delivery is
+                # saved, so that a supplier error can be shown in the form.
+                skus = [item.sku for item in items]
+                try:
+                    products = api.retrieve_unknown_supplier_products(
+                        supplier.id,
+                        skus
+                    )
+                except (SupplierAPIException,
+                        requests.RequestException) as e:
+                    raise forms.ValidationError(
+                        _('Products could not be retrieved from the '
+                          'supplier: %s') % str(e)
+                    )
+                self.supplier_products = products
         return self.cleaned_data
 
 
@@ -360,6 +385,7 @@ class DeliveryAdmin(admin.ModelAdmin):
     inlines = (DeliveryItemInline,)
     readonly_fields = ('total_amount', 'date_created', 'valid',
                        'error_message', 'locked',)
+    list_select_related = ('supplier',)
     ordering = ('-date_created',)
     actions = None
     form = DeliveryForm
@@ -403,13 +429,17 @@ class DeliveryAdmin(admin.ModelAdmin):
             return self.readonly_fields + ('supplier', 'report',)
         return self.readonly_fields
 
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.with_validity().with_totals()
+
     def save_model(self, request, obj, form, change):
         super(DeliveryAdmin, self).save_model(request, obj, form, change)
         if not change:
-            api.populate_delivery(obj.id)
+            api.populate_delivery(obj.id, products=form.supplier_products)
 
     def process_delivery(self, request, obj_id):
-        obj = get_object_or_404(models.Delivery, id=obj_id)
+        obj = get_object_or_404(self.get_queryset(request), id=obj_id)
         if obj.locked:
             raise Http404()
         elif not obj.valid:
@@ -480,14 +510,34 @@ class ProductTransactionCreatorInline(admin.TabularInline):
         return False
 
 
+@admin.register(models.ProductTransaction)
+class ProductTransactionAdmin(ReadonlyMixin, admin.ModelAdmin):
+    list_display = ('date_created', 'product', 'qty', 'trx_type',
+                    'trx_status',)
+    list_filter = ('trx_type',)
+    list_select_related = ('product',)
+    readonly_fields = ('product', 'qty', 'trx_type', 'trx_status',
+                       'date_created',)
+    fields = readonly_fields
+    date_hierarchy = 'date_created'
+    ordering = ('-date_created',)
+    # Counting all the transactions is slow and of little use.
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_status()
+
+
 @admin.register(models.Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'code', 'qty', 'price', 'active',)
     list_filter = ('active', 'category',)
     search_fields = ('code', 'name',)
     readonly_fields = ('qty', 'date_created', 'date_modified',
-                       '_out_of_stock_forecast',)
+                       '_out_of_stock_forecast', 'transaction_history',)
     ordering = ('name',)
+    # Number of the latest transactions shown on the change page.
+    latest_transactions = 25
     inlines = (BaseStockLevelInline, ProductTransactionCreatorInline,)
     fieldsets = (
         (None, {
@@ -506,7 +556,8 @@ class ProductAdmin(admin.ModelAdmin):
                 'qty',
                 'date_created',
                 'date_modified',
-                '_out_of_stock_forecast'
+                '_out_of_stock_forecast',
+                'transaction_history',
             )
         }),
     )
@@ -532,3 +583,24 @@ class ProductAdmin(admin.ModelAdmin):
     _out_of_stock_forecast.short_description = _('out of stock forecast')
     _out_of_stock_forecast.allow_tags = True
     _out_of_stock_forecast.admin_order_field = 'out_of_stock_forecast'
+
+    def transaction_history(self, obj):
+        # Only the latest transactions are shown, the rest can be found in
+        # the paginated transaction changelist.
+        if obj.id is None:
+            return None
+        trx_objs = obj.transactions.with_status() \
+            .order_by('-date_created')[:self.latest_transactions]
+        table = html_table(
+            (_('qty'), _('type'), _('status'), _('date created')),
+            ((trx_obj.qty, trx_obj.trx_type.name, trx_obj.trx_status.name,
+              trx_obj.date_created) for trx_obj in trx_objs)
+        )
+        return format_html(
+            '{}<a href="{}?product__id__exact={}">{}</a>',
+            table,
+            reverse('admin:shop_producttransaction_changelist'),
+            obj.id,
+            _('View all transactions')
+        )
+    transaction_history.short_description = _('transaction history')
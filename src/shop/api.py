@@ -1,19 +1,70 @@
+import hashlib
 import logging
 import numpy as np
+import requests
 import math
+import os
+import random
+import time
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from itertools import accumulate
 from datetime import date, timedelta
-from django.db import transaction
-from django.db.models import Sum
+from django.db import IntegrityError, connection, transaction
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import (
+    Case,
+    CharField,
+    Count,
+    DecimalField,
+    F,
+    IntegerField,
+    Max,
+    Sum,
+    Value,
+    When
+)
 from django.db.models.functions import TruncDay
 from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile, File
 from django.utils import timezone
+from moneyed import Money
 from sklearn.svm import SVR
+from utils.enums import validate_transition
 from .suppliers.base import SupplierAPIException
-from . import models, enums, suppliers, exceptions
+from . import models, enums, images, suppliers, exceptions
 
 log = logging.getLogger(__name__)
 
+# Number of free stock-take chunks to choose from at random when claiming one
+# without SKIP LOCKED support.
+STOCKTAKE_CHUNK_CANDIDATES = 20
+
+# Maximum number of concurrent requests made to a supplier.
+SUPPLIER_API_WORKERS = 8
+
+# Number of supplier products written in a single UPDATE statement.
+SUPPLIER_PRODUCT_UPDATE_BATCH_SIZE = 100
+
+# Maximum number of concurrent product image downloads and the timeout (in
+# seconds) of a single download.
+IMAGE_FETCH_WORKERS = 8
+IMAGE_FETCH_TIMEOUT = 10
+
+# Number of images whose thumbnails are generated concurrently.
+IMAGE_THUMBNAIL_WORKERS = 4
+
+# Age of an unused image file after which it is considered orphaned.
+ORPHANED_IMAGE_GRACE_PERIOD = timedelta(hours=1)
+
+# Number of worker processes parsing delivery reports in a batch import.
+REPORT_PARSE_WORKERS = 4
+
+# Changes are looked up this much before a catalog sync cursor, as a change
+# may be committed some time after its modification time was taken.
+CATALOG_SYNC_OVERLAP = timedelta(minutes=1)
+
 
 @transaction.atomic
 def create_product(code, name):
@@ -45,6 +96,15 @@ def get_product(id):
         return None
 
 
+def get_products(ids):
+    """Returns the products with given ids in a dict keyed by id.
+
+    The products are fetched in a single query. Products that do not exist
+    are left out.
+    """
+    return models.Product.objects.in_bulk(set(ids))
+
+
 def get_product_transactions_by_ref(reference):
     """Return item transactions with given reference."""
     ct = ContentType.objects.get_for_model(reference)
@@ -88,6 +148,60 @@ def cancel_product_transaction(trx_id, reference=None):
     trx_obj.set_status(enums.TrxStatus.CANCELED, reference)
 
 
+@transaction.atomic
+def cancel_product_transactions_by_ref(references):
+    """Cancels the item transactions created with given references.
+
+    The same as calling `cancel_product_transaction` for every transaction,
+    but done in a fixed number of queries, however many transactions there
+    are. The product quantities are adjusted in a single statement.
+
+    :param references: Mapping of the references the transactions were
+        created with, all instances of the same model, to the references
+        they are canceled with (or None).
+    """
+    if not references:
+        return
+    cancel_refs = {ref.pk: ref_obj for ref, ref_obj in references.items()}
+    ct = ContentType.objects.get_for_model(next(iter(references)))
+    trxs = models.ProductTransactionStatus.objects.filter(
+        reference_ct=ct,
+        reference_id__in=cancel_refs
+    ).values_list('trx_id', 'reference_id', 'trx__product_id', 'trx__qty')
+    trxs = {trx_id: rest for trx_id, *rest in trxs}
+    # Only one transaction with given reference should exist
+    ref_counts = Counter(reference_id for reference_id, _, _ in trxs.values())
+    assert (set(ref_counts) == set(cancel_refs) and
+            all(count == 1 for count in ref_counts.values()))
+    # The states are ordered from the newest, so the first one is current.
+    statuses = {}
+    for trx_id, status in models.ProductTransactionStatus.objects.filter(
+        trx_id__in=trxs
+    ).order_by('-date_created').values_list('trx_id', 'status'):
+        statuses.setdefault(trx_id, status)
+
+    status_objs = []
+    deltas = defaultdict(int)
+    for trx_id, (reference_id, product_id, qty) in trxs.items():
+        validate_transition(
+            enums.TrxStatus,
+            from_state=statuses[trx_id],
+            to_state=enums.TrxStatus.CANCELED
+        )
+        cancel_ref = cancel_refs[reference_id]
+        status_objs.append(models.ProductTransactionStatus(
+            trx_id=trx_id,
+            status=enums.TrxStatus.CANCELED,
+            reference_ct=(ContentType.objects.get_for_model(cancel_ref)
+                          if cancel_ref is not None else None),
+            reference_id=cancel_ref.pk if cancel_ref is not None else None
+        ))
+        deltas[product_id] -= qty
+    # Saving the states one by one would adjust the quantities one by one.
+    models.ProductTransactionStatus.objects.bulk_create(status_objs)
+    apply_product_qty_deltas(deltas)
+
+
 def list_products(start=None, limit=None, **kwargs):
     """Returns a list of products matching the criteria.
 
@@ -101,6 +215,206 @@ def list_categories():
     return models.ProductCategory.objects.all()
 
 
+ProductImagesFetch = namedtuple(
+    'ProductImagesFetch',
+    ['updated', 'unchanged', 'missing', 'failed']
+)
+
+
+def _fetch_product_image(session, url, product_obj):
+    """Makes a conditional request for the image of a product.
+
+    Returns the response, or None if the request failed.
+    """
+    headers = {}
+    if product_obj.image:
+        if product_obj.image_etag:
+            headers['If-None-Match'] = product_obj.image_etag
+        if product_obj.image_last_modified:
+            headers['If-Modified-Since'] = product_obj.image_last_modified
+    try:
+        return session.get(url, headers=headers,
+                           timeout=IMAGE_FETCH_TIMEOUT)
+    except requests.RequestException:
+        log.exception('Failed to fetch product image (url: %s)', url)
+        return None
+
+
+def fetch_product_images(url_template, **kwargs):
+    """Fetches the images of the products matching the criteria.
+
+    The image URL of a product is given by formatting `url_template` with
+    the product `code`. The images are fetched concurrently with conditional
+    requests, and only the images whose content has changed are written.
+    """
+    product_objs = list(models.Product.objects.filter(**kwargs))
+    if not product_objs:
+        return ProductImagesFetch(updated=0, unchanged=0, missing=0, failed=0)
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=IMAGE_FETCH_WORKERS
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def fetch(product_obj):
+        url = url_template.format(ean=product_obj.code)
+        return _fetch_product_image(session, url, product_obj)
+
+    updated, unchanged, missing, failed = 0, 0, 0, 0
+    workers = min(IMAGE_FETCH_WORKERS, len(product_objs))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # The responses are handled in this thread, as the database
+        # connections are not shared between the worker threads.
+        responses = executor.map(fetch, product_objs)
+        for product_obj, response in zip(product_objs, responses):
+            if response is None:
+                failed += 1
+                continue
+            if response.status_code == 304:
+                unchanged += 1
+                continue
+            if response.status_code == 404:
+                missing += 1
+                continue
+            if response.status_code != 200:
+                log.warning('Failed to fetch product image (url: %s, '
+                            'status: %s)', response.url, response.status_code)
+                failed += 1
+                continue
+            product_obj.image_etag = response.headers.get('ETag', '')
+            product_obj.image_last_modified = response.headers.get(
+                'Last-Modified', ''
+            )
+            update_fields = ['image_etag', 'image_last_modified']
+            checksum = hashlib.sha256(response.content).hexdigest()
+            if product_obj.image and checksum == product_obj.image_checksum:
+                unchanged += 1
+            else:
+                product_obj.image_checksum = checksum
+                product_obj.image.save('tmp.jpg',
+                                       ContentFile(response.content),
+                                       save=False)
+                update_fields += ['image', 'image_checksum', 'date_modified']
+                updated += 1
+            product_obj.save(update_fields=update_fields)
+    return ProductImagesFetch(
+        updated=updated,
+        unchanged=unchanged,
+        missing=missing,
+        failed=failed
+    )
+
+
+def generate_image_thumbnails():
+    """Generates the thumbnails of all the product and category images.
+
+    Returns the number of processed images and the number of images that
+    could not be read.
+    """
+    field_files = [
+        obj.image for model in (models.Product, models.ProductCategory)
+        for obj in model.objects.exclude(image='').exclude(image=None)
+    ]
+    if not field_files:
+        return 0, 0
+    workers = min(IMAGE_THUMBNAIL_WORKERS, len(field_files))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(images.generate_thumbnails, field_files))
+    return results.count(True), results.count(False)
+
+
+def delete_orphaned_images():
+    """Deletes the product and category images that are no longer in use.
+
+    Recently modified files are kept, as they may belong to uploads that have
+    not been committed yet. Returns the number of deleted files.
+    """
+    deleted = 0
+    threshold = timezone.now() - ORPHANED_IMAGE_GRACE_PERIOD
+    for model, directory in ((models.Product, 'product'),
+                             (models.ProductCategory, 'category')):
+        storage = model._meta.get_field('image').storage
+        if not storage.exists(directory):
+            continue
+        in_use = set()
+        for name in model.objects.exclude(image='').exclude(image=None) \
+                .values_list('image', flat=True):
+            in_use.add(name)
+            in_use.update(images.thumbnail_name(name, size)
+                          for size in images.THUMBNAIL_SIZES)
+        _, filenames = storage.listdir(directory)
+        for filename in filenames:
+            name = '{}/{}'.format(directory, filename)
+            if name in in_use or storage.get_modified_time(name) > threshold:
+                continue
+            storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+def get_catalog_version():
+    """Returns an identifier of the current state of the product catalog.
+
+    The identifier changes whenever a product or a category is created,
+    modified or deleted.
+    """
+    products = models.Product.objects.aggregate(
+        count=Count('id'),
+        modified=Max('date_modified')
+    )
+    categories = models.ProductCategory.objects.aggregate(
+        count=Count('id'),
+        modified=Max('date_modified')
+    )
+    state = repr((sorted(products.items()), sorted(categories.items())))
+    return hashlib.sha1(state.encode()).hexdigest()[:20]
+
+
+CatalogChanges = namedtuple(
+    'CatalogChanges',
+    ['until', 'products', 'categories', 'deleted_products',
+     'deleted_categories']
+)
+
+
+def list_catalog_changes(since):
+    """Returns the changes made to the product catalog after given time.
+
+    Created and modified products and categories are returned in full, while
+    deactivated or deleted products and deleted categories are listed by id.
+    Changes made shortly before `since` may be returned again. Pass `until`
+    as `since` of the next call to get the changes made in between.
+    """
+    until = timezone.now()
+    since -= CATALOG_SYNC_OVERLAP
+    products = list(models.Product.objects.filter(
+        date_modified__gte=since
+    ).select_related('category'))
+    categories = list(models.ProductCategory.objects.filter(
+        date_modified__gte=since
+    ))
+    tombstones = models.CatalogTombstone.objects.filter(
+        date_deleted__gte=since
+    ).values_list('content_type_id', 'object_id')
+    deleted = defaultdict(set)
+    for content_type_id, object_id in tombstones:
+        deleted[content_type_id].add(object_id)
+    product_ct = ContentType.objects.get_for_model(models.Product)
+    category_ct = ContentType.objects.get_for_model(models.ProductCategory)
+    deleted_products = deleted[product_ct.id]
+    deleted_products.update(p.id for p in products if not p.active)
+    return CatalogChanges(
+        until=until,
+        products=[p for p in products if p.active],
+        categories=categories,
+        deleted_products=sorted(deleted_products),
+        deleted_categories=sorted(deleted[category_ct.id])
+    )
+
+
 @transaction.atomic
 def get_supplier_product(supplier_id, sku, refresh=False):
     """Returns supplier product for given SKU.
@@ -138,40 +452,301 @@ def get_supplier_product(supplier_id, sku, refresh=False):
     return product_obj
 
 
+SupplierProductsRefresh = namedtuple(
+    'SupplierProductsRefresh',
+    ['fetched', 'changed', 'failed', 'fetch_time', 'update_time']
+)
+
+
+def _bulk_update_supplier_products(product_objs):
+    """Writes name, price and units of given supplier products in bulk."""
+    def case(values, output_field):
+        return Case(
+            *[When(id=obj_id, then=Value(value)) for obj_id, value in values],
+            output_field=output_field
+        )
+
+    now = timezone.now()
+    for i in range(0, len(product_objs), SUPPLIER_PRODUCT_UPDATE_BATCH_SIZE):
+        batch = product_objs[i:i + SUPPLIER_PRODUCT_UPDATE_BATCH_SIZE]
+        models.SupplierProduct.objects.filter(
+            id__in=[obj.id for obj in batch]
+        ).update(
+            name=case(((obj.id, obj.name) for obj in batch), CharField()),
+            price=case(((obj.id, obj.price.amount) for obj in batch),
+                       DecimalField(max_digits=10, decimal_places=2)),
+            price_currency=case(
+                ((obj.id, str(obj.price.currency)) for obj in batch),
+                CharField()
+            ),
+            units=case(((obj.id, obj.units) for obj in batch),
+                       IntegerField()),
+            date_modified=now
+        )
+
+
+def refresh_supplier_products(supplier_id=None):
+    """Refreshes the supplier products with the data from the suppliers.
+
+    The products are retrieved concurrently and only the ones whose name,
+    price or units have changed are written to the database.
+    """
+    qs = models.SupplierProduct.objects.select_related('supplier')
+    if supplier_id is not None:
+        qs = qs.filter(supplier_id=supplier_id)
+    supplier_product_objs = defaultdict(list)
+    for obj in qs:
+        supplier_product_objs[obj.supplier.internal_name].append(obj)
+
+    start = time.monotonic()
+    fetched, failed = 0, 0
+    changed_objs = []
+    for internal_name, product_objs in supplier_product_objs.items():
+        products = retrieve_supplier_products(
+            internal_name,
+            [obj.sku for obj in product_objs],
+            raise_errors=False
+        )
+        for obj in product_objs:
+            product_data = products[obj.sku]
+            if product_data is None:
+                failed += 1
+                continue
+            fetched += 1
+            currency = obj.price_currency or settings.DEFAULT_CURRENCY
+            price = Money(product_data.price, currency)
+            if (obj.name, obj.price, obj.units) == \
+                    (product_data.name, price, product_data.units):
+                continue
+            obj.name = product_data.name
+            obj.price = price
+            obj.units = product_data.units
+            changed_objs.append(obj)
+    fetch_time = time.monotonic() - start
+
+    start = time.monotonic()
+    with transaction.atomic():
+        _bulk_update_supplier_products(changed_objs)
+    update_time = time.monotonic() - start
+
+    return SupplierProductsRefresh(
+        fetched=fetched,
+        changed=len(changed_objs),
+        failed=failed,
+        fetch_time=fetch_time,
+        update_time=update_time
+    )
+
+
+def _report_cache_key(supplier_internal_name, report_path):
+    # Returns None if the report cannot be read, so that the supplier API
+    # gets to report the error.
+    content_hash = hashlib.sha256()
+    try:
+        with open(report_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                content_hash.update(chunk)
+    except OSError:
+        return None
+    return 'delivery-report:{}:{}'.format(supplier_internal_name,
+                                          content_hash.hexdigest())
+
+
 def parse_report(supplier_internal_name, report_path):
-    """Parses a report file and returns parsed items."""
+    """Parses a report file and returns parsed items.
+
+    The parsed items are cached by the content of the report file, so the
+    same report is parsed only once.
+    """
+    report_cache = caches['reports']
+    key = _report_cache_key(supplier_internal_name, report_path)
+    items = report_cache.get(key) if key is not None else None
+    if items is None:
+        supplier_api = suppliers.get_supplier_api(supplier_internal_name)
+        items = supplier_api.parse_delivery_report(report_path)
+        if key is not None:
+            report_cache.set(key, items)
+    return items
+
+
+def _parse_report_file(supplier_internal_name, report_path):
+    # Runs in a worker process of `import_delivery_reports`, so the result
+    # is returned instead of being cached here.
+    supplier_api = suppliers.get_supplier_api(supplier_internal_name)
+    try:
+        return supplier_api.parse_delivery_report(report_path), None
+    except SupplierAPIException as e:
+        return None, str(e)
+
+
+ReportImport = namedtuple('ReportImport', ['path', 'delivery', 'error'])
+
+
+def import_delivery_reports(supplier_id, report_paths):
+    """Creates and populates a delivery for each of the given report files.
+
+    The reports are parsed in parallel worker processes. Returns a list of
+    `ReportImport`, with either the created delivery or the parse error of
+    every report.
+    """
+    supplier_obj = models.Supplier.objects.get(id=supplier_id)
+    internal_name = supplier_obj.internal_name
+    report_paths = list(report_paths)
+    if not report_paths:
+        return []
+    workers = min(REPORT_PARSE_WORKERS, len(report_paths))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            _parse_report_file,
+            [internal_name] * len(report_paths),
+            report_paths
+        ))
+    report_cache = caches['reports']
+    imports = []
+    for report_path, (items, error) in zip(report_paths, results):
+        if error is not None:
+            imports.append(ReportImport(report_path, None, error))
+            continue
+        # Let `populate_delivery` pick up the parsed items.
+        report_cache.set(_report_cache_key(internal_name, report_path), items)
+        delivery_obj = models.Delivery(supplier=supplier_obj)
+        with open(report_path, 'rb') as f:
+            delivery_obj.report.save(os.path.basename(report_path), File(f))
+        populate_delivery(delivery_obj.id)
+        imports.append(ReportImport(report_path, delivery_obj, None))
+    return imports
+
+
+def retrieve_supplier_products(supplier_internal_name, skus,
+                               raise_errors=True):
+    """Retrieves product data for several SKUs from a supplier concurrently.
+
+    Returns a dictionary mapping the SKUs to the retrieved product data, or
+    to None if a product could not be found at the supplier. If
+    `raise_errors` is False, failed lookups are logged and treated as not
+    found.
+    """
+    skus = list(skus)
+    if not skus:
+        return {}
+    rate_limiter = suppliers.get_rate_limiter(supplier_internal_name)
     supplier_api = suppliers.get_supplier_api(supplier_internal_name)
-    return supplier_api.parse_delivery_report(report_path)
+
+    def retrieve(sku):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        try:
+            return supplier_api.retrieve_product(sku)
+        except Exception:
+            if raise_errors:
+                raise
+            log.exception('Failed to retrieve product (sku: %s, '
+                          'supplier: %s)', sku, supplier_internal_name)
+            return None
+
+    workers = min(SUPPLIER_API_WORKERS, len(skus))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(skus, executor.map(retrieve, skus)))
 
 
 @transaction.atomic
-def populate_delivery(delivery_id):
-    """Populates the delivery with products based on the imported report."""
-    delivery_obj = models.Delivery.objects.get(id=delivery_id)
+def create_supplier_products(supplier_id, products):
+    """Creates supplier products in bulk from retrieved product data.
+
+    Products that already exist in the database are left untouched.
+
+    :param products: Mapping of SKUs to the retrieved product data.
+    """
+    existing_skus = set(models.SupplierProduct.objects.filter(
+        supplier_id=supplier_id,
+        sku__in=products.keys()
+    ).values_list('sku', flat=True))
+    product_objs = [
+        models.SupplierProduct(
+            supplier_id=supplier_id,
+            sku=sku,
+            name=product_data.name,
+            price=product_data.price,
+            units=product_data.units
+        )
+        for sku, product_data in products.items()
+        if product_data is not None and sku not in existing_skus
+    ]
+    models.SupplierProduct.objects.bulk_create(product_objs)
+    return product_objs
+
+
+def retrieve_unknown_supplier_products(supplier_id, skus):
+    """Retrieves the products that are not known yet from the supplier.
+
+    Returns a dictionary like `retrieve_supplier_products` does, for the
+    SKUs that have no supplier product in the database.
+    """
+    supplier_obj = models.Supplier.objects.get(id=supplier_id)
+    # Keep the order of the SKUs, but retrieve every product only once.
+    skus = list(OrderedDict.fromkeys(skus))
+    known_skus = set(models.SupplierProduct.objects.filter(
+        supplier_id=supplier_obj.id,
+        sku__in=skus
+    ).values_list('sku', flat=True))
+    products = retrieve_supplier_products(
+        supplier_obj.internal_name,
+        [sku for sku in skus if sku not in known_skus]
+    )
+    for sku, product_data in products.items():
+        if product_data is None:
+            log.warning('Product not found (sku: %s, supplier: %s)',
+                        sku, supplier_obj.id)
+    return products
+
+
+def populate_delivery(delivery_id, products=None):
+    """Populates the delivery with products based on the imported report.
+
+    Products that are not known yet are retrieved from the supplier before
+    any changes are made to the database, unless they have been retrieved
+    beforehand with `retrieve_unknown_supplier_products` and are given as
+    `products`.
+    """
+    delivery_obj = models.Delivery.objects.select_related('supplier') \
+        .get(id=delivery_id)
     supplier_obj = delivery_obj.supplier
     items = parse_report(supplier_obj.internal_name, delivery_obj.report.path)
-    for item in items:
-        product_obj = get_supplier_product(supplier_obj.id, item.sku)
-        if product_obj is not None:
-            models.DeliveryItem.objects.create(
+    if products is None:
+        products = retrieve_unknown_supplier_products(
+            supplier_obj.id,
+            [item.sku for item in items]
+        )
+    supplier_product_qs = models.SupplierProduct.objects.filter(
+        supplier_id=supplier_obj.id,
+        sku__in={item.sku for item in items}
+    )
+    with transaction.atomic():
+        create_supplier_products(supplier_obj.id, products)
+        product_objs = {obj.sku: obj for obj in supplier_product_qs}
+        models.DeliveryItem.objects.bulk_create([
+            models.DeliveryItem(
                 delivery=delivery_obj,
-                supplier_product_id=product_obj.id,
-                qty=item.qty * product_obj.qty_multiplier,
-                price=item.price / product_obj.qty_multiplier
+                supplier_product_id=product_objs[item.sku].id,
+                qty=item.qty * product_objs[item.sku].qty_multiplier,
+                price=item.price / product_objs[item.sku].qty_multiplier
             )
+            for item in items if item.sku in product_objs
+        ])
     return delivery_obj
 
 
 @transaction.atomic
 def process_delivery(delivery_id):
     """Adjusts the stock quantities based on the delivery data."""
-    delivery_obj = models.Delivery.objects.get(id=delivery_id)
+    delivery_obj = models.Delivery.objects.with_validity().get(id=delivery_id)
     assert delivery_obj.valid, ('Some of the delivered items are not '
                                 'associated with a product in the system.')
-    for item in delivery_obj.delivery_items.all():
+    item_objs = delivery_obj.delivery_items.select_related('supplier_product')
+    for item in item_objs:
         supplier_product = item.supplier_product
         create_product_transaction(
-            product_id=supplier_product.product.id,
+            product_id=supplier_product.product_id,
             trx_type=enums.TrxType.INVENTORY,
             qty=item.qty,
             reference=item
@@ -180,6 +755,29 @@ def process_delivery(delivery_id):
     delivery_obj.save()
 
 
+def apply_product_qty_deltas(deltas):
+    """Adjusts the cached quantities of several products in one statement.
+
+    :param deltas: Mapping of product ids to quantity differences.
+    """
+    # Group the products by their delta, so that the statement stays short
+    # even for big catalogs, where most of the deltas are the same.
+    product_ids = defaultdict(list)
+    for product_id, delta in deltas.items():
+        if delta:
+            product_ids[delta].append(product_id)
+    if not product_ids:
+        return
+    cases = [When(id__in=ids, then=Value(delta))
+             for delta, ids in product_ids.items()]
+    models.Product.objects.filter(id__in=[
+        product_id for ids in product_ids.values() for product_id in ids
+    ]).update(
+        qty=F('qty') + Case(*cases, output_field=IntegerField()),
+        date_modified=timezone.now()
+    )
+
+
 @transaction.atomic
 def initiate_stocktaking(chunk_size=10):
     """Initiates a stock-taking procedure for all the products."""
@@ -191,12 +789,21 @@ def initiate_stocktaking(chunk_size=10):
     # Order products by category, so that chunk contain mostly that share
     # category. Products in the same category are most often placed near each
     # other, which should make the process of stock-taking more effective.
-    product_objs = list(models.Product.objects.all().order_by('category'))
-    for i in range(0, len(product_objs), chunk_size):
-        chunk_obj = stocktake_obj.chunks.create()
-        chunk_products = product_objs[i:i + chunk_size]
-        for p in chunk_products:
-            chunk_obj.items.create(product=p)
+    product_ids = list(
+        models.Product.objects.order_by('category').values_list('id',
+                                                                flat=True)
+    )
+    chunk_objs = []
+    item_objs = []
+    for i in range(0, len(product_ids), chunk_size):
+        chunk_obj = models.StocktakeChunk(stocktake=stocktake_obj)
+        chunk_objs.append(chunk_obj)
+        item_objs.extend(
+            models.StocktakeItem(chunk=chunk_obj, product_id=product_id)
+            for product_id in product_ids[i:i + chunk_size]
+        )
+    models.StocktakeChunk.objects.bulk_create(chunk_objs)
+    models.StocktakeItem.objects.bulk_create(item_objs)
     return stocktake_obj
 
 
@@ -207,18 +814,38 @@ def finalize_stocktaking(stocktake_id):
     if stocktake_obj.locked:
         raise exceptions.APIException('Stock-taking already finished.')
     # Make sure that all the chunks are finished
-    chunk_objs = stocktake_obj.chunks.all()
-    if not all(obj.locked for obj in chunk_objs):
+    if stocktake_obj.chunks.filter(locked=False).exists():
         raise exceptions.APIException('Found unfinished chunks.')
-    for chunk_obj in chunk_objs:
-        for item_obj in chunk_obj.items.all():
-            product_obj = item_obj.product
-            create_product_transaction(
-                product_id=product_obj.id,
-                trx_type=enums.TrxType.CORRECTION,
-                qty=item_obj.qty - product_obj.qty,
-                reference=item_obj
-            )
+    # Compute the corrections in the database by comparing the counted
+    # quantities with the current quantities of the products.
+    corrections = models.StocktakeItem.objects.filter(
+        chunk__stocktake=stocktake_obj
+    ).annotate(
+        correction=F('qty') - F('product__qty')
+    ).values_list('id', 'product_id', 'correction')
+    ct = ContentType.objects.get_for_model(models.StocktakeItem)
+    trx_objs = []
+    state_objs = []
+    deltas = {}
+    for item_id, product_id, correction in corrections:
+        trx_obj = models.ProductTransaction(
+            product_id=product_id,
+            trx_type=enums.TrxType.CORRECTION,
+            qty=correction
+        )
+        trx_objs.append(trx_obj)
+        state_objs.append(models.ProductTransactionStatus(
+            trx=trx_obj,
+            status=enums.TrxStatus.PENDING,
+            reference_ct=ct,
+            reference_id=item_id
+        ))
+        deltas[product_id] = correction
+    # Bulk inserts do not trigger the signal that updates the cached product
+    # quantities, so the quantities are adjusted separately below.
+    models.ProductTransaction.objects.bulk_create(trx_objs)
+    models.ProductTransactionStatus.objects.bulk_create(state_objs)
+    apply_product_qty_deltas(deltas)
     stocktake_obj.locked = True
     stocktake_obj.save()
     return stocktake_obj
@@ -234,31 +861,58 @@ def finalize_stocktake_chunk(chunk_id):
     chunk_obj.save()
 
 
+def _claim_chunk_skip_locked(chunk_qs, user_id):
+    """Claims a chunk by locking a single row, skipping the locked ones."""
+    chunk_obj = chunk_qs.select_for_update(skip_locked=True).first()
+    if chunk_obj is not None:
+        chunk_obj.owner_id = user_id
+        chunk_obj.save(update_fields=['owner'])
+    return chunk_obj
+
+
+def _claim_chunk_optimistic(chunk_qs, user_id):
+    """Claims a chunk using conditional updates, retrying on conflicts."""
+    while True:
+        chunk_ids = list(chunk_qs.values_list('id', flat=True)[
+            :STOCKTAKE_CHUNK_CANDIDATES
+        ])
+        if not chunk_ids:
+            return None
+        # Spread concurrent users over different chunks, so that they do not
+        # all compete for the first one.
+        random.shuffle(chunk_ids)
+        for chunk_id in chunk_ids:
+            # The update succeeds only if nobody has taken the chunk since
+            # the candidates were retrieved.
+            if chunk_qs.filter(id=chunk_id).update(owner_id=user_id):
+                return models.StocktakeChunk.objects.get(id=chunk_id)
+
+
 @transaction.atomic
 def assign_free_stocktake_chunk(user_id, stocktake_id):
     """Assigns a free stock-take chunk to a user, if any free left.
 
     If user is already assigned to a chunk, that chunk should be returned.
+
+    Only the chosen chunk gets locked, so that several users can be assigned
+    chunks at the same time. Databases that do not support SKIP LOCKED fall
+    back to claiming the chunk with a conditional update.
     """
-    chunk_qs = models.StocktakeChunk.objects.select_for_update()
+    chunk_qs = models.StocktakeChunk.objects.filter(stocktake_id=stocktake_id)
     try:
-        return chunk_qs.get(
-            stocktake_id=stocktake_id,
-            owner_id=user_id
-        )
+        return chunk_qs.get(owner_id=user_id)
     except models.StocktakeChunk.DoesNotExist:
         pass
-    chunk_objs = chunk_qs.filter(
-        stocktake_id=stocktake_id,
-        locked=False,
-        owner__isnull=True
-    )
-    if not chunk_objs:
-        return None
-    chunk_obj = chunk_objs.first()
-    chunk_obj.owner_id = user_id
-    chunk_obj.save()
-    return chunk_obj
+    free_chunk_qs = chunk_qs.filter(locked=False, owner__isnull=True)
+    features = connection.features
+    try:
+        with transaction.atomic():
+            if getattr(features, 'has_select_for_update_skip_locked', False):
+                return _claim_chunk_skip_locked(free_chunk_qs, user_id)
+            return _claim_chunk_optimistic(free_chunk_qs, user_id)
+    except IntegrityError:
+        # The user has been assigned a chunk by a concurrent request.
+        return chunk_qs.get(owner_id=user_id)
 
 
 @transaction.atomic
@@ -357,20 +1011,17 @@ def update_out_of_stock_forecast(product_id):
     product_obj.save()
 
 
-def order_from_supplier(product_id, qty, supplier_id=None):
-    """Orders the cheapest product from a supplier."""
-    products = models.SupplierProduct.objects.filter(product_id=product_id)
-
-    if supplier_id is not None:
-        products = products.filter(supplier_id=supplier_id)
+def _order_options(supplier_products, qty):
+    """Returns the ways of ordering `qty` units of a product, cheapest first.
 
+    Every option is a pair of a supplier product and the number of its
+    packages that need to be ordered.
+    """
     # A product can be associated with several different supplier products from
     # the same supplier. Supplier products are also most often sold in batches,
     # which means you usually cannot purchase the exact amount you need.
     # Following section of the code takes care of calculating the minimum cost
-    # of each product while taking `qty` into account. It will then try to
-    # purchase the cheapest one and if not possible (for example out of stock),
-    # continue onto next one.
+    # of each product while taking `qty` into account.
     def minimum_qty(sp):
         return math.ceil(qty / sp.qty)
 
@@ -379,24 +1030,43 @@ def order_from_supplier(product_id, qty, supplier_id=None):
         # be purchased in order to reach `qty`.
         return minimum_qty(sp) * sp.qty * sp.unit_price
 
-    products = sorted(products, key=cost)
-    for product in products:
+    supplier_products = sorted(supplier_products, key=cost)
+    return [(sp, minimum_qty(sp)) for sp in supplier_products]
+
+
+def order_from_supplier(product_id, qty, supplier_id=None):
+    """Orders the cheapest product from a supplier.
+
+    If the cheapest product cannot be ordered (for example out of stock), the
+    next one is tried.
+    """
+    products = models.SupplierProduct.objects.filter(product_id=product_id) \
+        .select_related('supplier')
+
+    if supplier_id is not None:
+        products = products.filter(supplier_id=supplier_id)
+
+    for product, packages in _order_options(products, qty):
         supplier = product.supplier
         supplier_api = suppliers.get_supplier_api(supplier.internal_name)
         try:
-            supplier_api.order_product(product.sku, minimum_qty(product))
+            supplier_api.order_product(product.sku, packages)
             return product
         except SupplierAPIException:
             # Log the error and try the next product.
-            log.warning('Failed to order product SKU %d from %s.',
+            log.warning('Failed to order product SKU %s from %s.',
                         product.sku, supplier.internal_name)
-    else:
-        msg = 'Could not order {}.'.format(product.sku)
-        raise exceptions.APIException(msg)
+    msg = 'Could not order {}.'.format(product_id)
+    raise exceptions.APIException(msg)
 
 
 def order_refill(supplier_id, current_date=None):
-    """Orders products that will run out of stock before the next delivery."""
+    """Orders products that will run out of stock before the next delivery.
+
+    The cheapest way of ordering every product is planned up front, then all
+    the products are ordered from the supplier at once. The products that
+    could not be ordered are retried with their next cheapest option.
+    """
     def next_weekday(d, weekday):
         days_ahead = weekday - d.weekday()
         if days_ahead <= 0:
@@ -410,15 +1080,46 @@ def order_refill(supplier_id, current_date=None):
     second_delivery = next_weekday(first_delivery, delivery_weekday)
     # Get base stock levels for the products that will run out of the stock
     # before the second delivery.
-    base_levels = models.BaseStockLevel.objects.filter(
+    base_levels = list(models.BaseStockLevel.objects.filter(
         product__out_of_stock_forecast__lt=second_delivery
-    )
-    ordered = []
+    ))
+    supplier_products = defaultdict(list)
+    for sp in models.SupplierProduct.objects.filter(
+            supplier_id=supplier.id,
+            product_id__in=[obj.product_id for obj in base_levels]):
+        supplier_products[sp.product_id].append(sp)
+    plan = []
     for base_level in base_levels:
-        sp = order_from_supplier(
-            base_level.product.id,
-            base_level.level,
-            supplier_id=supplier.id
-        )
-        ordered.append(sp)
+        options = _order_options(supplier_products[base_level.product_id],
+                                 base_level.level)
+        if not options:
+            log.warning('Product %s is not sold by %s.',
+                        base_level.product_id, supplier.internal_name)
+            continue
+        plan.append(options)
+
+    supplier_api = suppliers.get_supplier_api(supplier.internal_name)
+    ordered, failed = [], []
+    while plan:
+        lines = [(options[0][0].sku, options[0][1]) for options in plan]
+        try:
+            failed_skus = set(supplier_api.order_products(lines))
+        except SupplierAPIException as e:
+            raise exceptions.APIException(str(e))
+        remaining = []
+        for options in plan:
+            sp = options[0][0]
+            if sp.sku not in failed_skus:
+                ordered.append(sp)
+                continue
+            log.warning('Failed to order product SKU %s from %s.',
+                        sp.sku, supplier.internal_name)
+            if len(options) > 1:
+                remaining.append(options[1:])
+            else:
+                failed.append(sp.product_id)
+        plan = remaining
+    if failed:
+        msg = 'Could not order {}.'.format(', '.join(map(str, failed)))
+        raise exceptions.APIException(msg)
     return ordered
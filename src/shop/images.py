@@ -0,0 +1,70 @@
+import io
+import logging
+import os
+from collections import OrderedDict
+
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+# Bounding boxes of the generated thumbnails, the aspect ratio of the
+# original image is kept.
+THUMBNAIL_SIZES = OrderedDict([
+    ('small', (128, 128)),
+    ('medium', (256, 256)),
+    ('large', (512, 512)),
+])
+
+THUMBNAIL_QUALITY = 85
+
+
+def thumbnail_name(name, size):
+    """Returns the storage name of a thumbnail of given image."""
+    root, _ = os.path.splitext(name)
+    return '{root}.{size}.jpg'.format(root=root, size=size)
+
+
+def thumbnail_urls(field_file):
+    """Returns the URLs of the thumbnails of given image, keyed by size."""
+    if not field_file:
+        return None
+    return OrderedDict(
+        (size, field_file.storage.url(thumbnail_name(field_file.name, size)))
+        for size in THUMBNAIL_SIZES
+    )
+
+
+def generate_thumbnails(field_file):
+    """Generates the thumbnails of given image.
+
+    Existing thumbnails are replaced. Returns False if the image could not
+    be read.
+    """
+    storage = field_file.storage
+    try:
+        with storage.open(field_file.name) as f:
+            image = Image.open(f)
+            image.load()
+    except (OSError, SyntaxError):
+        # Pillow raises SyntaxError on some malformed files.
+        log.warning('Failed to read image (name: %s)', field_file.name)
+        return False
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    for size, box in THUMBNAIL_SIZES.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail(box, Image.ANTIALIAS)
+        buf = io.BytesIO()
+        thumbnail.save(buf, 'JPEG', quality=THUMBNAIL_QUALITY)
+        # The thumbnails are written directly under their names, as they are
+        # named after the original image.
+        with storage.open(thumbnail_name(field_file.name, size), 'wb') as f:
+            f.write(buf.getvalue())
+    return True
+
+
+def delete_image(storage, name):
+    """Deletes an image together with its thumbnails."""
+    storage.delete(name)
+    for size in THUMBNAIL_SIZES:
+        storage.delete(thumbnail_name(name, size))
@@ -0,0 +1,10 @@
+import shop.api
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Deletes the product and category images that are not in use.'
+
+    def handle(self, *args, **options):
+        deleted = shop.api.delete_orphaned_images()
+        self.stdout.write('Deleted {} orphaned images.'.format(deleted))
@@ -0,0 +1,13 @@
+import shop.api
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Generates the thumbnails of the product and category images.'
+
+    def handle(self, *args, **options):
+        processed, failed = shop.api.generate_image_thumbnails()
+        self.stdout.write(
+            'Generated thumbnails for {} images, {} could not be '
+            'read.'.format(processed, failed)
+        )
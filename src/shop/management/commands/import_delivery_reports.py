@@ -0,0 +1,27 @@
+import shop.api
+from django.core.management.base import BaseCommand, CommandError
+from shop.models import Supplier
+
+
+class Command(BaseCommand):
+    help = 'Creates deliveries from several delivery reports at once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('supplier_id')
+        parser.add_argument('reports', nargs='+', metavar='report')
+
+    def handle(self, *args, **options):
+        try:
+            imports = shop.api.import_delivery_reports(
+                options['supplier_id'],
+                options['reports']
+            )
+        except Supplier.DoesNotExist:
+            raise CommandError('Supplier not found.')
+        for report_import in imports:
+            if report_import.error is not None:
+                self.stderr.write('{0.path}: {0.error}'.format(report_import))
+            else:
+                self.stdout.write('{0.path}: delivery {0.delivery.id}'.format(
+                    report_import
+                ))
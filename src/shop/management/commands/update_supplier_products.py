@@ -1,16 +1,24 @@
 import shop.api
 from django.core.management.base import BaseCommand
-from shop.models import SupplierProduct
 
 
 class Command(BaseCommand):
+    help = 'Refreshes the supplier products with the data from the suppliers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--supplier',
+            dest='supplier_id',
+            help='Only refresh the products of the supplier with given id.'
+        )
+
     def handle(self, *args, **options):
-        products = shop.api.list_products()
-        products = SupplierProduct.objects.all()
-        for product in products:
-            print('Updating {}...'.format(product))
-            shop.api.get_supplier_product(
-                product.supplier.id,
-                product.sku,
-                refresh=True
-            )
+        result = shop.api.refresh_supplier_products(options['supplier_id'])
+        self.stdout.write(
+            'Fetched {0.fetched} products in {0.fetch_time:.2f}s, '
+            '{0.failed} failed.'.format(result)
+        )
+        self.stdout.write(
+            'Updated {0.changed} changed products in '
+            '{0.update_time:.2f}s.'.format(result)
+        )
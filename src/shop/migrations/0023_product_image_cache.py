@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0022_auto_20170313_2018'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_checksum',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_etag',
+            field=models.CharField(blank=True, default='', editable=False, max_length=128),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_last_modified',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import shop.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0023_product_image_cache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=shop.models.ImageFileSystemStorage(), upload_to=shop.models.generate_product_filename),
+        ),
+        migrations.AlterField(
+            model_name='productcategory',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=shop.models.ImageFileSystemStorage(), upload_to=shop.models.generate_category_filename),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0024_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcategory',
+            name='date_created',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, editable=False, null=True, verbose_name='date created'),
+        ),
+        migrations.AddField(
+            model_name='productcategory',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, null=True, verbose_name='date modified'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('shop', '0025_productcategory_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogTombstone',
+            fields=[
+                ('id', models.UUIDField(serialize=False, primary_key=True, default=uuid.uuid4, editable=False)),
+                ('object_id', models.UUIDField()),
+                ('date_deleted', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+            options={
+                'verbose_name': 'catalog tombstone',
+                'verbose_name_plural': 'catalog tombstones',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='product',
+            index_together=set([('date_modified',)]),
+        ),
+        migrations.AlterIndexTogether(
+            name='productcategory',
+            index_together=set([('date_modified',)]),
+        ),
+    ]
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import uuid
 from django.db import models
@@ -25,11 +26,45 @@ class OverwriteFileSystemStorage(FileSystemStorage):
         return name
 
 
+class ImageFileSystemStorage(OverwriteFileSystemStorage):
+    """Storage of product and category images.
+
+    If `CONTENT_HASHED_IMAGES` is set, a hash of the content is added to the
+    file names, so a name is never reused for different content.
+    """
+    def _save(self, name, content):
+        if not settings.CONTENT_HASHED_IMAGES:
+            return super()._save(name, content)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # The very same content is already stored.
+            return name
+        return super()._save(name, content)
+
+    @staticmethod
+    def hashed_name(name, content):
+        content_hash = hashlib.sha256()
+        for chunk in content.chunks():
+            content_hash.update(chunk)
+        content.seek(0)
+        root, ext = os.path.splitext(name)
+        return '{root}.{hash}{ext}'.format(
+            root=root,
+            hash=content_hash.hexdigest()[:16],
+            ext=ext
+        )
+
+
 def generate_product_filename(instance, filename):
     _, ext = os.path.splitext(filename)
     return 'product/{code}{ext}'.format(ext=ext, code=instance.code)
 
 
+def generate_category_filename(instance, filename):
+    _, ext = os.path.splitext(filename)
+    return 'category/{id}{ext}'.format(ext=ext, id=instance.id)
+
+
 def generate_supplier_product_filename(instance, filename):
     _, ext = os.path.splitext(filename)
     return 'supplier/{supplier}/{sku}{ext}'.format(
@@ -121,18 +156,32 @@ class Stocktake(UUIDModel, TimeStampedModel):
     """
     locked = models.BooleanField(default=False)
 
+    objects = querysets.StocktakeQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Stock-take')
         verbose_name_plural = _('Stock-takes')
 
+    def _chunk_counts(self):
+        # Use the values annotated by `with_progress()` when available.
+        obj = self
+        if self._state.adding:
+            return 0, 0
+        if not hasattr(obj, 'chunk_count'):
+            obj = Stocktake.objects.with_progress().get(pk=self.pk)
+        return obj.chunk_count, obj.locked_chunk_count or 0
+
     @property
     def complete(self):
-        return all(self.chunks.values_list('locked', flat=True))
+        chunk_count, locked_chunk_count = self._chunk_counts()
+        return chunk_count == locked_chunk_count
 
     @property
     def progress(self):
-        chunks = list(self.chunks.values_list('locked', flat=True))
-        return chunks.count(True) / len(chunks)
+        chunk_count, locked_chunk_count = self._chunk_counts()
+        if not chunk_count:
+            return 1.0
+        return locked_chunk_count / chunk_count
 
     def __str__(self):
         return str(self.id)
@@ -180,10 +229,22 @@ class Delivery(UUIDModel, TimeStampedModel):
                               storage=OverwriteFileSystemStorage())
     locked = models.BooleanField(default=False)
 
+    objects = querysets.DeliveryQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Delivery')
         verbose_name_plural = _('Deliveries')
 
+    def _item_counts(self):
+        # Use the values annotated by `with_validity()` when available.
+        obj = self
+        if self._state.adding:
+            return 0, 0
+        if not hasattr(obj, 'unassociated_item_count'):
+            obj = Delivery.objects.with_validity().get(pk=self.pk)
+        return (obj.unassociated_item_count or 0,
+                obj.unreceived_item_count or 0)
+
     @property
     def valid(self):
         """Tells whether the delivery is valid for processing or not."""
@@ -192,22 +253,24 @@ class Delivery(UUIDModel, TimeStampedModel):
     @property
     def associated(self):
         """Tells if all the delivered items are associated with a product."""
-        qs = self.items.all().select_related('product')
-        return all(item.product is not None for item in qs)
+        return self._item_counts()[0] == 0
 
     @property
     def received(self):
         """Tells if all the delivered items are marked as received."""
-        return all(item.received for item in self.delivery_items.all())
+        return self._item_counts()[1] == 0
 
     @property
     def total_amount(self):
-        items = self.delivery_items.all()
-        if not items:
+        # Use the values annotated by `with_totals()` when available.
+        obj = self
+        if self._state.adding:
             return None
-        currency = items[0].price_currency
-        zero_money = Money(0, currency)
-        return sum((item.total_price for item in items.all()), zero_money)
+        if not hasattr(obj, 'total_price_amount'):
+            obj = Delivery.objects.with_totals().get(pk=self.pk)
+        if obj.total_price_amount is None:
+            return None
+        return Money(obj.total_price_amount, obj.total_price_currency)
 
     def __str__(self):
         fmt = 'Delivery from {0.supplier.name} ({0.date_created})'
@@ -247,14 +310,17 @@ class DeliveryItem(UUIDModel):
             return None
 
 
-class ProductCategory(UUIDModel):
+class ProductCategory(UUIDModel, TimeStampedModel):
     """Groups together similar products."""
     name = models.CharField(max_length=64)
-    image = models.ImageField(blank=True, null=True)
+    image = models.ImageField(blank=True, null=True,
+                              upload_to=generate_category_filename,
+                              storage=ImageFileSystemStorage())
 
     class Meta:
         verbose_name = _('category')
         verbose_name_plural = _('categories')
+        index_together = [('date_modified',)]
 
     def __str__(self):
         return '{0.name}'.format(self)
@@ -266,7 +332,14 @@ class Product(UUIDModel, TimeStampedModel):
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(blank=True, null=True,
                               upload_to=generate_product_filename,
-                              storage=OverwriteFileSystemStorage())
+                              storage=ImageFileSystemStorage())
+    # cache validators and checksum of the last fetched image
+    image_etag = models.CharField(max_length=128, blank=True, default='',
+                                  editable=False)
+    image_last_modified = models.CharField(max_length=32, blank=True,
+                                           default='', editable=False)
+    image_checksum = models.CharField(max_length=64, blank=True, default='',
+                                      editable=False)
     category = models.ForeignKey(ProductCategory, blank=True, null=True)
     # TODO: make sure that the price cannot be negative
     price = MoneyField(
@@ -286,11 +359,26 @@ class Product(UUIDModel, TimeStampedModel):
     class Meta:
         verbose_name = _('product')
         verbose_name_plural = _('products')
+        index_together = [('date_modified',)]
 
     def __str__(self):
         return '{0.name}'.format(self)
 
 
+class CatalogTombstone(UUIDModel):
+    """Records the deletion of a product or a category from the catalog."""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.UUIDField()
+    date_deleted = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = _('catalog tombstone')
+        verbose_name_plural = _('catalog tombstones')
+
+    def __str__(self):
+        return '{0.content_type} {0.object_id}'.format(self)
+
+
 class ProductTransaction(UUIDModel, TimeStampedModel):
     product = models.ForeignKey(Product, related_name='transactions')
     qty = models.IntegerField(verbose_name=_('quantity'))
@@ -300,6 +388,9 @@ class ProductTransaction(UUIDModel, TimeStampedModel):
 
     @property
     def trx_status(self):
+        if hasattr(self, 'latest_states'):
+            # The states have been prefetched
+            return self.latest_states[0].status
         # As a transaction should never _not_ be in a state, we want
         # latest to throw an exception when this does not happen
         state = self.states.latest('date_created')
@@ -8,6 +8,14 @@ class ProductQuerySet(models.QuerySet):
 
 
 class ProductTrxQuerySet(models.QuerySet):
+    def with_status(self):
+        # Fetch the states of all the transactions in a single query, so
+        # that the status does not have to be queried per transaction. The
+        # states are ordered from the newest by default.
+        return self.prefetch_related(
+            models.Prefetch('states', to_attr='latest_states')
+        )
+
     def restocks(self):
         return self.filter(trx_type__in=[
             enums.TrxType.INVENTORY,
@@ -26,3 +34,49 @@ class ProductTrxQuerySet(models.QuerySet):
         )
 
         return states
+
+
+class StocktakeQuerySet(models.QuerySet):
+    def with_progress(self):
+        """Annotates the number of all and locked chunks."""
+        return self.annotate(
+            chunk_count=models.Count('chunks'),
+            locked_chunk_count=models.Sum(models.Case(
+                models.When(chunks__locked=True, then=1),
+                default=0,
+                output_field=models.IntegerField()
+            ))
+        )
+
+
+class DeliveryQuerySet(models.QuerySet):
+    def with_validity(self):
+        """Annotates the number of unassociated and not received items."""
+        return self.annotate(
+            unassociated_item_count=models.Sum(models.Case(
+                models.When(
+                    delivery_items__isnull=False,
+                    delivery_items__supplier_product__product__isnull=True,
+                    then=1
+                ),
+                default=0,
+                output_field=models.IntegerField()
+            )),
+            unreceived_item_count=models.Sum(models.Case(
+                models.When(delivery_items__received=False, then=1),
+                default=0,
+                output_field=models.IntegerField()
+            ))
+        )
+
+    def with_totals(self):
+        """Annotates the total price of the delivered items."""
+        return self.annotate(
+            total_price_amount=models.Sum(
+                models.F('delivery_items__qty') *
+                models.F('delivery_items__price'),
+                output_field=models.DecimalField(max_digits=12,
+                                                 decimal_places=2)
+            ),
+            total_price_currency=models.Max('delivery_items__price_currency')
+        )
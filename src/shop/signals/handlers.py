@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from functools import partial
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .. import models, enums
+from .. import models, enums, images
 
 
 @receiver(post_save, sender=models.ProductTransactionStatus)
@@ -26,3 +30,42 @@ def update_cached_product_quantity(sender, instance, created, **kwargs):
         return
 
     product_obj.save()
+
+
+@receiver(pre_save, sender=models.Product)
+@receiver(pre_save, sender=models.ProductCategory)
+def detect_image_upload(sender, instance, update_fields, **kwargs):
+    # An assigned file is committed to the storage when the model is saved,
+    # while a file saved through the field file is already committed, so it
+    # has to be listed in the update fields.
+    instance._image_changed = bool(instance.image) and (
+        not instance.image._committed or
+        (update_fields is not None and 'image' in update_fields)
+    )
+    instance._previous_image_name = None
+    if instance._image_changed and not instance._state.adding:
+        instance._previous_image_name = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=models.Product)
+@receiver(post_save, sender=models.ProductCategory)
+def generate_image_thumbnails(sender, instance, **kwargs):
+    if instance._image_changed:
+        images.generate_thumbnails(instance.image)
+        previous_name = instance._previous_image_name
+        if previous_name and previous_name != instance.image.name:
+            # The previous image is orphaned once the new one is committed.
+            transaction.on_commit(partial(
+                images.delete_image, instance.image.storage, previous_name
+            ))
+
+
+@receiver(post_delete, sender=models.Product)
+@receiver(post_delete, sender=models.ProductCategory)
+def create_catalog_tombstone(sender, instance, **kwargs):
+    models.CatalogTombstone.objects.create(
+        content_type=ContentType.objects.get_for_model(sender),
+        object_id=instance.pk
+    )
@@ -1,7 +1,121 @@
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
 from importlib import import_module
 
+from django.conf import settings
+
+SupplierCallStats = namedtuple(
+    'SupplierCallStats',
+    ['calls', 'errors', 'total_time', 'max_time']
+)
+
+
+class SupplierClient:
+    """Shares a supplier API between all the threads of a process.
+
+    The calls made to the supplier API are counted and timed per method.
+    Supplier APIs have to be thread-safe.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self.api, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @wraps(attr)
+        def call(*args, **kwargs):
+            start = time.monotonic()
+            failed = True
+            try:
+                result = attr(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self._record(name, time.monotonic() - start, failed)
+        return call
+
+    def _record(self, name, duration, failed):
+        with self._lock:
+            stats = self._stats.get(name, SupplierCallStats(0, 0, 0, 0))
+            self._stats[name] = SupplierCallStats(
+                calls=stats.calls + 1,
+                errors=stats.errors + failed,
+                total_time=stats.total_time + duration,
+                max_time=max(stats.max_time, duration)
+            )
+
+    @property
+    def stats(self):
+        """Returns the call statistics, keyed by the method name."""
+        with self._lock:
+            return dict(self._stats)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
 
 def get_supplier_api(internal_name):
-    """Provides supplier API for the supplier with given internal name."""
-    name = '.{}'.format(internal_name)
-    return import_module(name, __name__).SupplierAPI()
+    """Provides supplier API for the supplier with given internal name.
+
+    The supplier API is created once per process and shared by all the
+    callers.
+    """
+    with _clients_lock:
+        client = _clients.get(internal_name)
+        if client is None:
+            name = '.{}'.format(internal_name)
+            api = import_module(name, __name__).SupplierAPI()
+            client = _clients[internal_name] = SupplierClient(api)
+        return client
+
+
+def get_supplier_stats():
+    """Returns the call statistics of every supplier API in use."""
+    with _clients_lock:
+        clients = dict(_clients)
+    return {name: client.stats for name, client in clients.items()}
+
+
+class RateLimiter:
+    """Spaces out calls made from several threads to `rate` calls a second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_call = 0
+
+    def wait(self):
+        """Blocks until the next call is allowed."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + 1 / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(internal_name):
+    """Provides the rate limiter shared by all the calls to a supplier.
+
+    Returns None if the calls to the supplier are not rate limited.
+    """
+    rate = settings.SUPPLIER_API_RATE_LIMITS.get(internal_name)
+    if not rate:
+        return None
+    with _rate_limiters_lock:
+        rate_limiter = _rate_limiters.get(internal_name)
+        if rate_limiter is None or rate_limiter.rate != rate:
+            rate_limiter = _rate_limiters[internal_name] = RateLimiter(rate)
+        return rate_limiter
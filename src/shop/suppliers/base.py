@@ -16,6 +16,9 @@ class SupplierBase(metaclass=ABCMeta):
     The mysterious SKU all over this class is abbreviation for Stock Keeping
     Unit and in this context it is basically an unique identifier for every
     product at supplier.
+
+    A single instance is shared by all the threads of a process, so the
+    implementations have to be thread-safe.
     """
 
     @abstractmethod
@@ -47,3 +50,21 @@ class SupplierBase(metaclass=ABCMeta):
         :param qty: Quantity.
         :type qty: int
         """
+
+    def order_products(self, lines):
+        """Places orders on several products at once.
+
+        Suppliers that can order several products in a single request should
+        override this method, by default the products are ordered one by one.
+
+        :param lines: Pairs of SKU and quantity of the products to be ordered.
+        :type lines: List[Tuple[str, int]]
+        :rtype: List[str] -- SKUs of the products that could not be ordered.
+        """
+        failed = []
+        for sku, qty in lines:
+            try:
+                self.order_product(sku, qty)
+            except SupplierAPIException:
+                failed.append(sku)
+        return failed
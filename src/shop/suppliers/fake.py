@@ -0,0 +1,88 @@
+import csv
+import decimal
+import threading
+import time
+import zlib
+from collections import Counter
+
+from django.conf import settings
+
+from .base import (
+    DeliveryItem,
+    SupplierAPIException,
+    SupplierBase,
+    SupplierProduct
+)
+
+
+class SupplierAPI(SupplierBase):
+    """Local supplier that simulates a remote one, e.g. for benchmarking.
+
+    Every call sleeps for `latency` seconds to imitate a network round trip
+    and is counted in `calls`. Product data is derived from the SKU, so no
+    setup is needed, except that products with non-numeric SKUs do not
+    exist. Delivery reports are CSV files with `sku,qty,price` rows.
+    """
+
+    def __init__(self, latency=None):
+        if latency is None:
+            latency = settings.FAKE_SUPPLIER_LATENCY
+        self.latency = latency
+        self.calls = Counter()
+        self.cart = Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def parse_delivery_report(self, report_path):
+        try:
+            with open(report_path, newline='') as f:
+                rows = list(csv.reader(f))
+        except (OSError, UnicodeDecodeError):
+            raise SupplierAPIException('The report could not be read.')
+        try:
+            items = [
+                DeliveryItem(
+                    sku=sku,
+                    qty=int(qty),
+                    price=decimal.Decimal(price)
+                ) for sku, qty, price in rows
+            ]
+        except (ValueError, decimal.InvalidOperation):
+            raise SupplierAPIException('The report could not be parsed.')
+        if not items:
+            raise SupplierAPIException('The report could not be parsed.')
+        return items
+
+    def retrieve_product(self, sku):
+        self._call('retrieve_product')
+        if not sku.isdigit():
+            return None
+        checksum = zlib.crc32(sku.encode())
+        return SupplierProduct(
+            name='Product {}'.format(sku),
+            price=decimal.Decimal(checksum % 10000) / 100,
+            units=checksum % 24 + 1
+        )
+
+    def order_product(self, sku, qty):
+        self._call('order_product')
+        if not sku.isdigit():
+            raise SupplierAPIException('Unknown product.')
+        with self._lock:
+            self.cart[sku] += qty
+
+    def order_products(self, lines):
+        self._call('order_products')
+        failed = []
+        with self._lock:
+            for sku, qty in lines:
+                if sku.isdigit():
+                    self.cart[sku] += qty
+                else:
+                    failed.append(sku)
+        return failed
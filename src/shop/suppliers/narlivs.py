@@ -1,7 +1,10 @@
 import re
 import decimal
+import logging
+import queue
 import subprocess
 import tempfile
+from contextlib import contextmanager
 
 import narlivs
 
@@ -14,6 +17,8 @@ from .base import (
     SupplierProduct
 )
 
+log = logging.getLogger(__name__)
+
 ITEM_PATTERN = re.compile(r"""
     \s*?\d+                    # Row
     \s+?(?P<sku>\d{9})         # SKU
@@ -56,10 +61,29 @@ class SupplierAPI(SupplierBase):
     """Supplier API implementation for Axfood Närlivs."""
 
     def __init__(self):
-        self.narlivs = narlivs.Narlivs(
-            username=settings.NARLIVS_USERNAME,
-            password=settings.NARLIVS_PASSWORD
-        )
+        # Logged in sessions that are not in use at the moment.
+        self._sessions = queue.LifoQueue()
+
+    @contextmanager
+    def session(self):
+        """Provides a logged in session for the duration of the block.
+
+        The sessions are not thread-safe, so a session is used by one thread
+        at a time, but it is kept for the later calls made by any thread.
+        A new session is logged in only if all the others are in use. An
+        expired session is re-authenticated on the next request.
+        """
+        try:
+            session = self._sessions.get_nowait()
+        except queue.Empty:
+            session = narlivs.Narlivs(
+                username=settings.NARLIVS_USERNAME,
+                password=settings.NARLIVS_PASSWORD
+            )
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
 
     def parse_delivery_report(self, report_path):
         data = pdf_to_text(report_path)
@@ -128,7 +152,8 @@ class SupplierAPI(SupplierBase):
         ]
 
     def retrieve_product(self, sku):
-        data = self.narlivs.get_product(sku=sku).data
+        with self.session() as session:
+            data = session.get_product(sku=sku).data
         if data is not None:
             return SupplierProduct(
                 name=data['name'].title(),
@@ -138,5 +163,21 @@ class SupplierAPI(SupplierBase):
         return None
 
     def order_product(self, sku, qty):
-        for _ in range(qty):
-            self.narlivs.get_cart().add_product(sku)
+        if self.order_products([(sku, qty)]):
+            raise SupplierAPIException('The product could not be ordered.')
+
+    def order_products(self, lines):
+        # The cart accepts a single unit at a time, but it is fetched only
+        # once for all the products.
+        failed = []
+        with self.session() as session:
+            cart = session.get_cart()
+            for sku, qty in lines:
+                try:
+                    for _ in range(qty):
+                        cart.add_product(sku)
+                except Exception:
+                    log.exception('Failed to add product to the cart '
+                                  '(sku: %s)', sku)
+                    failed.append(sku)
+        return failed
@@ -1,11 +1,17 @@
+import tempfile
 from unittest import mock
 
-from django.contrib import messages
+from django.contrib import admin, messages
+from django.contrib.admin.models import LogEntry
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from .. import exceptions
+from .. import exceptions, models
+from ..suppliers.base import SupplierAPIException
 from . import factories
 
 
@@ -55,3 +61,126 @@ class SupplierAdminTest(TestCase):
             response,
             reverse('admin:shop_supplier_change', args=(supplier.id,))
         )
+
+
+class DeliveryAdminTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            'the_baconator',
+            'bacon@foobar.com',
+            '123'
+        )
+        self.client.force_login(self.user)
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = self.settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.supplier_obj = factories.SupplierFactory(internal_name='fake')
+
+    def add_delivery(self):
+        return self.client.post(reverse('admin:shop_delivery_add'), {
+            'supplier': self.supplier_obj.id,
+            'report': SimpleUploadedFile('report.csv', b'101176931,2,9.25\n'),
+            'delivery_items-TOTAL_FORMS': 0,
+            'delivery_items-INITIAL_FORMS': 0,
+        })
+
+    def test_add_delivery(self):
+        response = self.add_delivery()
+        self.assertEqual(response.status_code, 302)
+        delivery_obj = models.Delivery.objects.get()
+        self.assertEqual(delivery_obj.delivery_items.count(), 1)
+
+    @mock.patch('shop.api.retrieve_supplier_products')
+    def test_add_delivery_supplier_error(self, mock_retrieve):
+        mock_retrieve.side_effect = SupplierAPIException('error')
+        response = self.add_delivery()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_retrieve.call_count, 1)
+        self.assertContains(response, 'could not be retrieved')
+        self.assertFalse(models.Delivery.objects.exists())
+        self.assertFalse(LogEntry.objects.exists())
+
+
+class ChangelistQueryCountTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            'the_baconator',
+            'bacon@foobar.com',
+            '123'
+        )
+        self.client.force_login(self.user)
+        # The first request to the admin creates the system wallets.
+        self.client.get(reverse('admin:index'))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_delivery_changelist(self):
+        url = reverse('admin:shop_delivery_changelist')
+
+        def create_deliveries(n):
+            for _ in range(n):
+                delivery_obj = factories.DeliveryFactory()
+                factories.DeliveryItemFactory.create_batch(
+                    size=3,
+                    delivery=delivery_obj
+                )
+
+        create_deliveries(2)
+        num_queries = self.count_queries(url)
+        create_deliveries(8)
+        self.assertEqual(self.count_queries(url), num_queries)
+
+    def test_stocktake_changelist(self):
+        url = reverse('admin:shop_stocktake_changelist')
+
+        def create_stocktakes(n):
+            for _ in range(n):
+                factories.StocktakeChunkFactory.create_batch(
+                    size=3,
+                    stocktake=factories.StocktakeFactory(locked=True)
+                )
+
+        create_stocktakes(2)
+        num_queries = self.count_queries(url)
+        create_stocktakes(8)
+        self.assertEqual(self.count_queries(url), num_queries)
+
+    def test_product_change(self):
+        product_obj = factories.ProductFactory()
+        url = reverse('admin:shop_product_change', args=(product_obj.id,))
+
+        def create_transactions(n):
+            for _ in range(n):
+                factories.ProductTrxStatusFactory(
+                    trx=factories.ProductTrxFactory(product=product_obj)
+                )
+
+        create_transactions(2)
+        self.client.get(url)
+        num_queries = self.count_queries(url)
+        create_transactions(30)
+        self.assertEqual(self.count_queries(url), num_queries)
+        response = self.client.get(url)
+        model_admin = admin.site._registry[models.Product]
+        table = model_admin.transaction_history(product_obj)
+        # The header row followed by the latest transactions.
+        self.assertEqual(table.count('<tr>'), 26)
+        self.assertContains(response, table, html=True)
+
+        history_url = '{}?product__id__exact={}'.format(
+            reverse('admin:shop_producttransaction_changelist'),
+            product_obj.id
+        )
+        self.assertContains(response, history_url)
+        factories.ProductTrxStatusFactory(trx=factories.ProductTrxFactory())
+        num_queries = self.count_queries(history_url)
+        create_transactions(10)
+        self.assertEqual(self.count_queries(history_url), num_queries)
+        response = self.client.get(history_url)
+        self.assertEqual(response.context['cl'].result_count, 42)
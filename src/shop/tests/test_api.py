@@ -1,19 +1,34 @@
+import hashlib
+import os
+import socket
+import tempfile
+import threading
 from datetime import date, datetime
 from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
 from unittest import mock
 
 from moneyed import Money
 
-from django.test import TestCase
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    skipUnlessDBFeature
+)
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 
+from ..suppliers import fake, narlivs
 from ..suppliers.base import (
     DeliveryItem,
     SupplierAPIException,
     SupplierProduct
 )
-from .. import api, models, enums, exceptions
+from .. import api, models, enums, exceptions, suppliers
 from .models import DummyModel
 from . import factories
 
@@ -170,6 +185,155 @@ class ShopAPITest(TestCase):
         self.assertEqual(delivery_items[0].qty, 40)
         self.assertEqual(delivery_items[0].price.amount, Decimal('4.62'))
 
+    @mock.patch('shop.suppliers.get_supplier_api')
+    def test_populate_delivery_unknown_products(self, mock_get_supplier_api):
+        m = mock_get_supplier_api.return_value = mock.MagicMock()
+        m.parse_delivery_report.return_value = [
+            DeliveryItem(sku='101176931', qty=20, price=Decimal('9.25')),
+            DeliveryItem(sku='101176932', qty=10, price=Decimal('12')),
+            DeliveryItem(sku='101176933', qty=5, price=Decimal('3')),
+            DeliveryItem(sku='101176932', qty=1, price=Decimal('12')),
+        ]
+        products = {
+            '101176932': SupplierProduct(
+                name='Billys Pan Pizza',
+                price=Decimal('12'),
+                units=1
+            ),
+            '101176933': None,
+        }
+        m.retrieve_product.side_effect = products.get
+        supplier_obj = factories.SupplierFactory.create()
+        factories.SupplierProductFactory.create(
+            supplier=supplier_obj,
+            sku='101176931',
+        )
+        delivery_obj = factories.DeliveryFactory(supplier=supplier_obj)
+        api.populate_delivery(delivery_obj.id)
+        # Only the unknown products are retrieved, each of them once.
+        m.retrieve_product.assert_has_calls([
+            mock.call('101176932'),
+            mock.call('101176933'),
+        ], any_order=True)
+        self.assertEqual(m.retrieve_product.call_count, 2)
+        sp_obj = models.SupplierProduct.objects.get(sku='101176932')
+        self.assertEqual(sp_obj.name, 'Billys Pan Pizza')
+        self.assertEqual(sp_obj.price, Money(12, 'SEK'))
+        self.assertFalse(
+            models.SupplierProduct.objects.filter(sku='101176933').exists()
+        )
+        item_skus = delivery_obj.delivery_items.values_list(
+            'supplier_product__sku', flat=True
+        )
+        self.assertEqual(sorted(item_skus),
+                         ['101176931', '101176932', '101176932'])
+
+    def test_populate_delivery_fake_supplier(self):
+        supplier_obj = factories.SupplierFactory.create(internal_name='fake')
+        with tempfile.TemporaryDirectory() as media_root, \
+                self.settings(MEDIA_ROOT=media_root):
+            with open(os.path.join(media_root, 'report.csv'), 'w') as f:
+                f.write('101176931,2,9.25\n101176932,3,12.00\n')
+            delivery_obj = factories.DeliveryFactory(
+                supplier=supplier_obj,
+                report='report.csv'
+            )
+            api.populate_delivery(delivery_obj.id)
+        self.assertEqual(delivery_obj.delivery_items.count(), 2)
+        self.assertEqual(supplier_obj.products.count(), 2)
+
+    def test_refresh_supplier_products(self):
+        supplier_obj = factories.SupplierFactory.create(internal_name='fake')
+        supplier_api = suppliers.get_supplier_api('fake')
+        product_data = supplier_api.retrieve_product('101176931')
+        unchanged_obj = factories.SupplierProductFactory.create(
+            supplier=supplier_obj,
+            sku='101176931',
+            name=product_data.name,
+            price=Money(product_data.price, 'SEK'),
+            units=product_data.units
+        )
+        changed_obj = factories.SupplierProductFactory.create(
+            supplier=supplier_obj,
+            sku='101176932',
+            name='Old name'
+        )
+        factories.SupplierProductFactory.create(
+            supplier=supplier_obj,
+            sku='bacon'
+        )
+        modified = unchanged_obj.date_modified
+        result = api.refresh_supplier_products(supplier_obj.id)
+        self.assertEqual(result.fetched, 2)
+        self.assertEqual(result.changed, 1)
+        self.assertEqual(result.failed, 1)
+        unchanged_obj.refresh_from_db()
+        self.assertEqual(unchanged_obj.date_modified, modified)
+        changed_obj.refresh_from_db()
+        product_data = supplier_api.retrieve_product('101176932')
+        self.assertEqual(changed_obj.name, product_data.name)
+        self.assertEqual(changed_obj.price, Money(product_data.price, 'SEK'))
+        self.assertEqual(changed_obj.units, product_data.units)
+
+    def test_refresh_supplier_products_failed_retrieval(self):
+        supplier_obj = factories.SupplierFactory.create(internal_name='fake')
+        product_obj = factories.SupplierProductFactory.create(
+            supplier=supplier_obj,
+            sku='101176931'
+        )
+        with mock.patch('shop.suppliers.fake.SupplierAPI.retrieve_product',
+                        side_effect=SupplierAPIException):
+            result = api.refresh_supplier_products()
+        self.assertEqual(result.fetched, 0)
+        self.assertEqual(result.changed, 0)
+        self.assertEqual(result.failed, 1)
+        name = product_obj.name
+        product_obj.refresh_from_db()
+        self.assertEqual(product_obj.name, name)
+
+    def test_parse_report_cached(self):
+        caches['reports'].clear()
+        parse_delivery_report = fake.SupplierAPI.parse_delivery_report
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv') as f1, \
+                tempfile.NamedTemporaryFile(mode='w', suffix='.csv') as f2, \
+                mock.patch.object(fake.SupplierAPI, 'parse_delivery_report',
+                                  autospec=True,
+                                  side_effect=parse_delivery_report) as m:
+            for f in (f1, f2):
+                f.write('101176931,2,9.25\n')
+                f.flush()
+            items = api.parse_report('fake', f1.name)
+            self.assertEqual(items[0].sku, '101176931')
+            # The second file has the same content.
+            self.assertEqual(api.parse_report('fake', f2.name), items)
+            self.assertEqual(m.call_count, 1)
+            with self.assertRaises(SupplierAPIException):
+                api.parse_report('fake', '404notfound')
+
+    def test_import_delivery_reports(self):
+        caches['reports'].clear()
+        supplier_obj = factories.SupplierFactory.create(internal_name='fake')
+        with tempfile.TemporaryDirectory() as media_root, \
+                self.settings(MEDIA_ROOT=media_root):
+            paths = []
+            for i, content in enumerate(['101176931,2,9.25\n',
+                                         'bacon\n',
+                                         '101176932,3,12.00\n']):
+                paths.append(os.path.join(media_root, '{}.csv'.format(i)))
+                with open(paths[-1], 'w') as f:
+                    f.write(content)
+            imports = api.import_delivery_reports(supplier_obj.id, paths)
+        self.assertEqual([i.path for i in imports], paths)
+        self.assertIsNone(imports[0].error)
+        self.assertIsNone(imports[1].delivery)
+        self.assertEqual(imports[1].error, 'The report could not be parsed.')
+        self.assertEqual(models.Delivery.objects.count(), 2)
+        delivery_obj = imports[2].delivery
+        self.assertTrue(delivery_obj.report.name.startswith('report/'))
+        item_obj = delivery_obj.delivery_items.get()
+        self.assertEqual(item_obj.supplier_product.sku, '101176932')
+        self.assertEqual(item_obj.qty, 3)
+
     def test_process_delivery(self):
         delivery_obj = factories.DeliveryFactory()
         item_obj1 = factories.DeliveryItemFactory(
@@ -273,6 +437,56 @@ class ShopAPITest(TestCase):
         trxs_qs = models.ProductTransaction.objects
         self.assertEqual(trxs_qs.count(), 6)
 
+    def test_initiate_stocktaking_query_count(self):
+        factories.ProductFactory.create_batch(size=25)
+        # The number of queries should not depend on the number of products.
+        with self.assertNumQueries(7):
+            stocktake_obj = api.initiate_stocktaking(chunk_size=10)
+        self.assertEqual(stocktake_obj.chunks.count(), 3)
+        item_qs = models.StocktakeItem.objects.filter(
+            chunk__stocktake=stocktake_obj
+        )
+        self.assertEqual(item_qs.count(), 25)
+
+    def test_finalize_stocktaking_query_count(self):
+        stocktake_obj = factories.StocktakeFactory.create()
+        chunk_obj = factories.StocktakeChunkFactory.create(
+            stocktake=stocktake_obj,
+            locked=True
+        )
+        item_objs = factories.StocktakeItemFactory.create_batch(
+            size=20,
+            chunk=chunk_obj
+        )
+        # Warm up the content type cache
+        ContentType.objects.get_for_model(models.StocktakeItem)
+        with self.assertNumQueries(9):
+            api.finalize_stocktaking(stocktake_obj.id)
+        for item_obj in item_objs:
+            item_obj.product.refresh_from_db()
+            self.assertEqual(item_obj.product.qty, item_obj.qty)
+            trx_obj = item_obj.product.transactions.get()
+            self.assertEqual(trx_obj.trx_type, enums.TrxType.CORRECTION)
+            self.assertEqual(trx_obj.trx_status, enums.TrxStatus.PENDING)
+            self.assertEqual(trx_obj.states.get().reference, item_obj)
+
+    def test_apply_product_qty_deltas(self):
+        product_obj1 = factories.ProductFactory.create(qty=5)
+        product_obj2 = factories.ProductFactory.create(qty=5)
+        product_obj3 = factories.ProductFactory.create(qty=5)
+        with self.assertNumQueries(1):
+            api.apply_product_qty_deltas({
+                product_obj1.id: -2,
+                product_obj2.id: 3,
+                product_obj3.id: 0,
+            })
+        product_obj1.refresh_from_db()
+        product_obj2.refresh_from_db()
+        product_obj3.refresh_from_db()
+        self.assertEqual(product_obj1.qty, 3)
+        self.assertEqual(product_obj2.qty, 8)
+        self.assertEqual(product_obj3.qty, 5)
+
     def test_finalize_stocktake_chunk(self):
         stocktake_obj = factories.StocktakeFactory.create()
         chunk_obj1 = factories.StocktakeChunkFactory.create(
@@ -469,8 +683,7 @@ class ShopAPITest(TestCase):
             mock.call(sp2.sku, 2),
         ])
 
-    @mock.patch('shop.api.order_from_supplier')
-    def test_order_refill(self, mock_order_from_supplier):
+    def test_order_refill(self):
         current_date = date(2017, 3, 2)
         product1 = factories.ProductFactory(
             qty=15,
@@ -480,24 +693,116 @@ class ShopAPITest(TestCase):
             qty=10,
             out_of_stock_forecast=date(2017, 3, 15)
         )
+        product3 = factories.ProductFactory(
+            qty=10,
+            out_of_stock_forecast=date(2017, 3, 3)
+        )
         factories.BaseStockLevel(product=product1, level=48)
         factories.BaseStockLevel(product=product2, level=32)
+        factories.BaseStockLevel(product=product3, level=10)
         supplier = factories.SupplierFactory(
-            delivers_on=enums.Weekdays.WEDNESDAY.value
+            delivers_on=enums.Weekdays.WEDNESDAY.value,
+            internal_name='fake'
         )
         factories.SupplierProductFactory(
             supplier=supplier,
-            product=product1
+            product=product1,
+            sku='bacon',
+            price=1,
+            units=48
+        )
+        sp2 = factories.SupplierProductFactory(
+            supplier=supplier,
+            product=product1,
+            price=40,
+            units=24
         )
         factories.SupplierProductFactory(
             supplier=supplier,
             product=product2
         )
-        api.order_refill(supplier.id, current_date)
-        mock_order_from_supplier.assert_has_calls([
-            mock.call(product1.id, 48, supplier_id=supplier.id)
+        sp4 = factories.SupplierProductFactory(
+            supplier=supplier,
+            product=product3,
+            price=10,
+            units=5
+        )
+        supplier_api = fake.SupplierAPI()
+        with mock.patch('shop.suppliers.get_supplier_api',
+                        return_value=supplier_api), \
+                self.assertNumQueries(3):
+            ordered = api.order_refill(supplier.id, current_date)
+        # The cheapest product of the first product could not be ordered,
+        # so the next cheapest one was ordered in a second request.
+        self.assertEqual(set(ordered), {sp2, sp4})
+        self.assertEqual(supplier_api.cart, {sp2.sku: 2, sp4.sku: 2})
+        self.assertEqual(supplier_api.calls, {'order_products': 2})
+
+        sp2.delete()
+        with mock.patch('shop.suppliers.get_supplier_api',
+                        return_value=supplier_api):
+            with self.assertRaises(exceptions.APIException):
+                api.order_refill(supplier.id, current_date)
+
+    @mock.patch('narlivs.Narlivs')
+    def test_order_refill_narlivs(self, mock_narlivs):
+        product_obj = factories.ProductFactory(
+            out_of_stock_forecast=date(2017, 3, 3)
+        )
+        factories.BaseStockLevel(product=product_obj, level=24)
+        supplier = factories.SupplierFactory(internal_name='narlivs')
+        sp1 = factories.SupplierProductFactory(
+            supplier=supplier,
+            product=product_obj,
+            price=10,
+            units=24
+        )
+        sp2 = factories.SupplierProductFactory(
+            supplier=supplier,
+            product=product_obj,
+            price=30,
+            units=24
+        )
+
+        def add_product(sku):
+            if sku == sp1.sku:
+                raise Exception('The product is not available.')
+        cart = mock_narlivs.return_value.get_cart.return_value
+        cart.add_product.side_effect = add_product
+        with mock.patch('shop.suppliers.get_supplier_api',
+                        return_value=narlivs.SupplierAPI()):
+            ordered = api.order_refill(supplier.id, date(2017, 3, 2))
+        # Närlivs rejected the cheapest product, so the next cheapest one
+        # was ordered instead.
+        self.assertEqual(ordered, [sp2])
+        cart.add_product.assert_has_calls([
+            mock.call(sp1.sku),
+            mock.call(sp2.sku),
         ])
 
+    def test_order_refill_remote_calls(self):
+        # Ordering a refill of many products makes a single request to the
+        # supplier, regardless of the number of products.
+        supplier = factories.SupplierFactory(internal_name='fake')
+        for _ in range(50):
+            product_obj = factories.ProductFactory(
+                out_of_stock_forecast=date(2017, 3, 3)
+            )
+            factories.BaseStockLevel(product=product_obj, level=24)
+            for units in (6, 12, 24):
+                factories.SupplierProductFactory(
+                    supplier=supplier,
+                    product=product_obj,
+                    units=units
+                )
+        supplier_api = fake.SupplierAPI()
+        with mock.patch('shop.suppliers.get_supplier_api',
+                        return_value=supplier_api) as get_supplier_api_mock:
+            ordered = api.order_refill(supplier.id, date(2017, 3, 2))
+        self.assertEqual(len(ordered), 50)
+        self.assertEqual(get_supplier_api_mock.call_count, 1)
+        self.assertEqual(supplier_api.calls, {'order_products': 1})
+
     def test_finalize_pending_product_trx(self):
         product_obj = factories.ProductFactory.create()
         trx_obj1 = api.create_product_transaction(
@@ -526,3 +831,175 @@ class ShopAPITest(TestCase):
         self.assertEqual(trx_obj2.trx_status, enums.TrxStatus.FINALIZED)
         # Quantity should not have changed when we've finalized
         self.assertEqual(product_obj.qty, 3)
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Serves product images from `images`, keyed by the request path."""
+    images = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, dict(self.headers)))
+        content = self.images.get(self.path)
+        if content is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', len(content))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FetchProductImagesTest(TestCase):
+    def setUp(self):
+        ImageHandler.images = {}
+        ImageHandler.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://127.0.0.1:{}/{{ean}}.jpg'.format(
+            self.server.server_port
+        )
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = self.settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_fetch_product_images(self):
+        product_obj1 = factories.ProductFactory.create(code='1234567812345')
+        product_obj2 = factories.ProductFactory.create(code='1234567812346')
+        ImageHandler.images['/1234567812345.jpg'] = b'banana'
+        result = api.fetch_product_images(self.url)
+        self.assertEqual(result, (1, 0, 1, 0))
+        product_obj1.refresh_from_db()
+        self.assertEqual(product_obj1.image.read(), b'banana')
+        self.assertTrue(product_obj1.image_etag)
+        product_obj2.refresh_from_db()
+        self.assertFalse(product_obj2.image)
+
+        # The image has not changed, so the server responds with 304.
+        modified = product_obj1.date_modified
+        result = api.fetch_product_images(self.url, code='1234567812345')
+        self.assertEqual(result, (0, 1, 0, 0))
+        path, headers = ImageHandler.requests[-1]
+        self.assertEqual(headers['If-None-Match'], product_obj1.image_etag)
+        product_obj1.refresh_from_db()
+        self.assertEqual(product_obj1.date_modified, modified)
+
+        # The validators are lost, but the content has not changed.
+        models.Product.objects.update(image_etag='')
+        result = api.fetch_product_images(self.url, code='1234567812345')
+        self.assertEqual(result, (0, 1, 0, 0))
+        product_obj1.refresh_from_db()
+        self.assertEqual(product_obj1.date_modified, modified)
+        self.assertTrue(product_obj1.image_etag)
+
+        ImageHandler.images['/1234567812345.jpg'] = b'apple'
+        result = api.fetch_product_images(self.url, code='1234567812345')
+        self.assertEqual(result, (1, 0, 0, 0))
+        product_obj1.refresh_from_db()
+        self.assertEqual(product_obj1.image.read(), b'apple')
+
+    def test_fetch_product_images_failed(self):
+        factories.ProductFactory.create(code='1234567812345')
+        # Nothing listens on the port of a closed socket.
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        url = 'http://127.0.0.1:{}/{{ean}}.jpg'.format(port)
+        result = api.fetch_product_images(url)
+        self.assertEqual(result, (0, 0, 0, 1))
+
+
+class StocktakeChunkAssignmentTest(TransactionTestCase):
+    COUNTERS = 20
+
+    def setUp(self):
+        self.stocktake_obj = factories.StocktakeFactory.create()
+        factories.StocktakeChunkFactory.create_batch(
+            size=self.COUNTERS + 5,
+            stocktake=self.stocktake_obj
+        )
+        self.user_objs = [
+            User.objects.create_user('counter{}'.format(i))
+            for i in range(self.COUNTERS)
+        ]
+
+    def test_optimistic_assignment(self):
+        user_objs = iter(self.user_objs)
+        other_user_obj = next(user_objs)
+
+        def steal_first_candidate(chunk_ids):
+            # Another user claims the chunk right after the candidates have
+            # been retrieved.
+            models.StocktakeChunk.objects.filter(id=chunk_ids[0]).update(
+                owner=other_user_obj
+            )
+
+        features = connection.features
+        with mock.patch.object(features, 'has_select_for_update_skip_locked',
+                               False, create=True):
+            with mock.patch('shop.api.random.shuffle') as mock_shuffle:
+                mock_shuffle.side_effect = steal_first_candidate
+                chunk_obj = api.assign_free_stocktake_chunk(
+                    next(user_objs).id, self.stocktake_obj.id
+                )
+            self.assertIsNotNone(chunk_obj)
+            self.assertNotEqual(chunk_obj.owner_id, other_user_obj.id)
+            for user_obj in user_objs:
+                api.assign_free_stocktake_chunk(user_obj.id,
+                                                self.stocktake_obj.id)
+        owners = models.StocktakeChunk.objects.filter(
+            owner__isnull=False
+        ).values_list('owner_id', flat=True)
+        self.assertEqual(sorted(owners),
+                         sorted(obj.id for obj in self.user_objs))
+
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_concurrent_assignment(self):
+        results = {}
+
+        def count(user_obj):
+            try:
+                chunk_obj = api.assign_free_stocktake_chunk(
+                    user_obj.id, self.stocktake_obj.id
+                )
+                results[user_obj.id] = chunk_obj.id
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            # Someone is holding a lock on one of the chunks, which should
+            # not block anyone else.
+            locked_chunk_obj = models.StocktakeChunk.objects \
+                .select_for_update() \
+                .order_by('id') \
+                .first()
+            threads = [threading.Thread(target=count, args=(user_obj,))
+                       for user_obj in self.user_objs]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=10)
+            self.assertFalse(any(thread.is_alive() for thread in threads))
+
+        chunk_ids = list(results.values())
+        self.assertEqual(len(chunk_ids), self.COUNTERS)
+        self.assertEqual(len(set(chunk_ids)), self.COUNTERS)
+        self.assertNotIn(locked_chunk_obj.id, chunk_ids)
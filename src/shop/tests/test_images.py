@@ -0,0 +1,155 @@
+import io
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from . import factories
+from .. import api, images, models
+
+
+def create_image(size=(1024, 768), fmt='PNG'):
+    buf = io.BytesIO()
+    Image.new('RGBA', size, (255, 0, 0, 128)).save(buf, fmt)
+    return SimpleUploadedFile('banana.png', buf.getvalue(), 'image/png')
+
+
+class ImageThumbnailTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = self.settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def assertThumbnails(self, field_file):
+        for size, box in images.THUMBNAIL_SIZES.items():
+            name = images.thumbnail_name(field_file.name, size)
+            with field_file.storage.open(name) as f:
+                thumbnail = Image.open(f)
+                self.assertEqual(thumbnail.format, 'JPEG')
+                self.assertEqual(thumbnail.size, (box[0], box[0] * 3 // 4))
+
+    def test_thumbnail_name(self):
+        self.assertEqual(
+            images.thumbnail_name('product/1234567812345.png', 'small'),
+            'product/1234567812345.small.jpg'
+        )
+
+    def test_thumbnail_urls(self):
+        product_obj = factories.ProductFactory.create(code='1234567812345')
+        self.assertIsNone(images.thumbnail_urls(product_obj.image))
+        product_obj.image = create_image()
+        product_obj.save()
+        urls = images.thumbnail_urls(product_obj.image)
+        self.assertEqual(list(urls), list(images.THUMBNAIL_SIZES))
+        self.assertTrue(urls['small'].endswith(
+            'product/1234567812345.small.jpg'
+        ))
+
+    def test_generate_on_save(self):
+        product_obj = factories.ProductFactory.create()
+        product_obj.image = create_image()
+        product_obj.save()
+        self.assertThumbnails(product_obj.image)
+
+        category_obj = factories.ProductCategoryFactory.create(
+            image=create_image()
+        )
+        self.assertThumbnails(category_obj.image)
+
+    def test_generate_on_field_file_save(self):
+        product_obj = factories.ProductFactory.create()
+        product_obj.image.save('tmp.png', create_image(), save=False)
+        product_obj.save(update_fields=['image'])
+        self.assertThumbnails(product_obj.image)
+
+    def test_generate_invalid_image(self):
+        product_obj = factories.ProductFactory.create()
+        product_obj.image = SimpleUploadedFile('banana.jpg', b'banana')
+        product_obj.save()
+        self.assertFalse(images.generate_thumbnails(product_obj.image))
+
+    def test_generate_image_thumbnails(self):
+        product_obj = factories.ProductFactory.create(image=create_image())
+        factories.ProductFactory.create()
+        category_obj = factories.ProductCategoryFactory.create(
+            image=create_image()
+        )
+        # Remove the thumbnails generated on save.
+        for field_file in (product_obj.image, category_obj.image):
+            for size in images.THUMBNAIL_SIZES:
+                field_file.storage.delete(
+                    images.thumbnail_name(field_file.name, size)
+                )
+        models.Product.objects.create(
+            name='Banana',
+            code='1234567812345',
+            price=product_obj.price,
+            image=SimpleUploadedFile('banana.jpg', b'banana')
+        )
+        self.assertEqual(api.generate_image_thumbnails(), (2, 1))
+        self.assertThumbnails(product_obj.image)
+        self.assertThumbnails(category_obj.image)
+
+
+class ContentHashedImageTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = self.settings(MEDIA_ROOT=media_root.name,
+                                 CONTENT_HASHED_IMAGES=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_hashed_name(self):
+        product_obj = factories.ProductFactory.create(code='1234567812345')
+        product_obj.image = create_image()
+        product_obj.save()
+        name = product_obj.image.name
+        self.assertRegex(name, r'^product/1234567812345\.[0-9a-f]{16}\.png$')
+        self.assertTrue(product_obj.image.storage.exists(
+            images.thumbnail_name(name, 'small')
+        ))
+
+        # The same content is stored under the same name.
+        product_obj.image = create_image()
+        product_obj.save()
+        self.assertEqual(product_obj.image.name, name)
+
+        product_obj.image = create_image(size=(640, 480))
+        product_obj.save()
+        self.assertNotEqual(product_obj.image.name, name)
+
+    @mock.patch('shop.signals.handlers.transaction.on_commit',
+                side_effect=lambda func: func())
+    def test_delete_previous_image(self, on_commit_mock):
+        category_obj = factories.ProductCategoryFactory.create(
+            image=create_image()
+        )
+        storage = category_obj.image.storage
+        name = category_obj.image.name
+        self.assertTrue(name.startswith('category/'))
+        category_obj.image = create_image(size=(640, 480))
+        category_obj.save()
+        self.assertEqual(on_commit_mock.call_count, 1)
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(storage.exists(images.thumbnail_name(name, 'small')))
+        self.assertTrue(storage.exists(category_obj.image.name))
+
+    def test_delete_orphaned_images(self):
+        product_obj = factories.ProductFactory.create(image=create_image())
+        storage = product_obj.image.storage
+        orphan_name = storage.save('product/orphan.png', create_image())
+        self.assertEqual(api.delete_orphaned_images(), 0)
+        with mock.patch('shop.api.ORPHANED_IMAGE_GRACE_PERIOD',
+                        timedelta(0)):
+            self.assertEqual(api.delete_orphaned_images(), 1)
+        self.assertFalse(storage.exists(orphan_name))
+        self.assertTrue(storage.exists(product_obj.image.name))
+        self.assertTrue(storage.exists(
+            images.thumbnail_name(product_obj.image.name, 'large')
+        ))
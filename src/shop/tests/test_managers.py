@@ -1,4 +1,5 @@
 from django.test import TestCase
+from moneyed import Money
 
 from . import factories
 from .. import enums, models
@@ -43,3 +44,80 @@ class ProductTrxQuerySetTests(TestCase):
                          enums.TrxStatus.FINALIZED)
         self.assertEqual(finalized.first().product.pk,
                          trx_obj1.product.pk)
+
+
+class StocktakeQuerySetTests(TestCase):
+    def test_with_progress(self):
+        stocktake_obj = factories.StocktakeFactory()
+        factories.StocktakeChunkFactory(stocktake=stocktake_obj, locked=True)
+        factories.StocktakeChunkFactory(stocktake=stocktake_obj, locked=False)
+        factories.StocktakeChunkFactory(stocktake=stocktake_obj, locked=False)
+        factories.StocktakeChunkFactory(stocktake=stocktake_obj, locked=True)
+        empty_stocktake_obj = factories.StocktakeFactory()
+        qs = models.Stocktake.objects.with_progress()
+        with self.assertNumQueries(1):
+            stocktake_obj = qs.get(id=stocktake_obj.id)
+            self.assertEqual(stocktake_obj.chunk_count, 4)
+            self.assertEqual(stocktake_obj.locked_chunk_count, 2)
+            self.assertEqual(stocktake_obj.progress, 0.5)
+            self.assertFalse(stocktake_obj.complete)
+        empty_stocktake_obj = qs.get(id=empty_stocktake_obj.id)
+        self.assertEqual(empty_stocktake_obj.progress, 1.0)
+        self.assertTrue(empty_stocktake_obj.complete)
+
+
+class DeliveryQuerySetTests(TestCase):
+    def test_with_validity(self):
+        delivery_obj = factories.DeliveryFactory()
+        factories.DeliveryItemFactory(delivery=delivery_obj, received=True)
+        item_obj = factories.DeliveryItemFactory(
+            delivery=delivery_obj,
+            received=False,
+            supplier_product__product=None
+        )
+        qs = models.Delivery.objects.with_validity()
+        with self.assertNumQueries(1):
+            obj = qs.get(id=delivery_obj.id)
+            self.assertEqual(obj.unassociated_item_count, 1)
+            self.assertEqual(obj.unreceived_item_count, 1)
+            self.assertFalse(obj.associated)
+            self.assertFalse(obj.received)
+            self.assertFalse(obj.valid)
+        item_obj.received = True
+        item_obj.save()
+        obj = qs.get(id=delivery_obj.id)
+        self.assertFalse(obj.associated)
+        self.assertTrue(obj.received)
+        self.assertFalse(obj.valid)
+
+    def test_with_validity_empty(self):
+        delivery_obj = factories.DeliveryFactory()
+        obj = models.Delivery.objects.with_validity().get(id=delivery_obj.id)
+        self.assertEqual(obj.unassociated_item_count, 0)
+        self.assertEqual(obj.unreceived_item_count, 0)
+        self.assertTrue(obj.associated)
+        self.assertTrue(obj.received)
+        self.assertTrue(obj.valid)
+
+    def test_with_totals(self):
+        delivery_obj = factories.DeliveryFactory()
+        factories.DeliveryItemFactory(
+            delivery=delivery_obj,
+            qty=3,
+            price=Money('2.50', 'SEK')
+        )
+        factories.DeliveryItemFactory(
+            delivery=delivery_obj,
+            qty=2,
+            price=Money(10, 'SEK')
+        )
+        empty_delivery_obj = factories.DeliveryFactory()
+        qs = models.Delivery.objects.with_totals()
+        with self.assertNumQueries(1):
+            obj = qs.get(id=delivery_obj.id)
+            self.assertEqual(obj.total_amount, Money('27.50', 'SEK'))
+        obj = qs.get(id=empty_delivery_obj.id)
+        self.assertIsNone(obj.total_amount)
+        # The values are computed on demand for not annotated objects
+        self.assertEqual(delivery_obj.total_amount, Money('27.50', 'SEK'))
+        self.assertIsNone(empty_delivery_obj.total_amount)
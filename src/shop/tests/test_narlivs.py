@@ -67,6 +67,20 @@ class NarlivsTest(TestCase):
             mock.call('1337')
         ])
 
+    @mock.patch('narlivs.Narlivs')
+    def test_session(self, mock_narlivs):
+        mock_narlivs.side_effect = lambda **kwargs: mock.MagicMock()
+        api = narlivs.SupplierAPI()
+        api.retrieve_product('1337')
+        api.retrieve_product('1338')
+        # The session is logged in once and reused by the later calls.
+        self.assertEqual(mock_narlivs.call_count, 1)
+        with api.session() as session1, api.session() as session2:
+            self.assertIsNot(session1, session2)
+        self.assertEqual(mock_narlivs.call_count, 2)
+        api.order_product('1337', 1)
+        self.assertEqual(mock_narlivs.call_count, 2)
+
     def test_receive_delivery2(self):
         api = get_supplier_api('narlivs')
         path = self.report_path('delivery_report2.pdf')
@@ -1,8 +1,99 @@
+import tempfile
+from decimal import Decimal
+from unittest import mock
 from django.test import TestCase
 from .. import suppliers
+from ..suppliers import fake
+from ..suppliers.base import SupplierAPIException, SupplierBase
 
 
 class SupplierTest(TestCase):
     def test_get_supplier_api(self):
         api = suppliers.get_supplier_api('narlivs')
         self.assertIsNotNone(api)
+        self.assertIs(suppliers.get_supplier_api('narlivs'), api)
+
+    def test_supplier_stats(self):
+        client = suppliers.SupplierClient(fake.SupplierAPI())
+        client.retrieve_product('101176931')
+        client.retrieve_product('101176932')
+        with self.assertRaises(SupplierAPIException):
+            client.order_product('bacon', 1)
+        self.assertEqual(client.api.calls['retrieve_product'], 2)
+        stats = client.stats
+        self.assertEqual(stats['retrieve_product'].calls, 2)
+        self.assertEqual(stats['retrieve_product'].errors, 0)
+        self.assertEqual(stats['order_product'].errors, 1)
+        self.assertGreaterEqual(stats['retrieve_product'].total_time,
+                                stats['retrieve_product'].max_time)
+        with mock.patch.dict('shop.suppliers._clients', {'fake': client}):
+            self.assertEqual(suppliers.get_supplier_stats()['fake'], stats)
+
+
+class FakeSupplierTest(TestCase):
+    def test_retrieve_product(self):
+        api = fake.SupplierAPI()
+        product = api.retrieve_product('101176931')
+        self.assertEqual(product, api.retrieve_product('101176931'))
+        self.assertEqual(product.name, 'Product 101176931')
+        self.assertIsNone(api.retrieve_product('bacon'))
+        self.assertEqual(api.calls['retrieve_product'], 3)
+
+    def test_parse_delivery_report(self):
+        api = fake.SupplierAPI()
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv') as f:
+            f.write('101176931,2,9.25\n')
+            f.flush()
+            items = api.parse_delivery_report(f.name)
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0].sku, '101176931')
+        self.assertEqual(items[0].qty, 2)
+        self.assertEqual(items[0].price, Decimal('9.25'))
+        with self.assertRaises(SupplierAPIException):
+            api.parse_delivery_report('404notfound')
+
+    def test_order_product(self):
+        api = fake.SupplierAPI()
+        api.order_product('101176931', 2)
+        api.order_product('101176931', 1)
+        self.assertEqual(api.cart['101176931'], 3)
+        self.assertEqual(api.calls['order_product'], 2)
+        with self.assertRaises(SupplierAPIException):
+            api.order_product('bacon', 1)
+
+    def test_order_products(self):
+        api = fake.SupplierAPI()
+        failed = api.order_products([('101176931', 2), ('bacon', 1),
+                                     ('101176932', 1)])
+        self.assertEqual(failed, ['bacon'])
+        self.assertEqual(api.cart, {'101176931': 2, '101176932': 1})
+        self.assertEqual(api.calls, {'order_products': 1})
+
+    def test_order_products_default(self):
+        api = fake.SupplierAPI()
+        # The default implementation orders the products one by one.
+        failed = SupplierBase.order_products(api, [('101176931', 2),
+                                                   ('bacon', 1)])
+        self.assertEqual(failed, ['bacon'])
+        self.assertEqual(api.calls, {'order_product': 2})
+
+
+class RateLimiterTest(TestCase):
+    def test_get_rate_limiter(self):
+        with self.settings(SUPPLIER_API_RATE_LIMITS={'fake': 10}):
+            rate_limiter = suppliers.get_rate_limiter('fake')
+            self.assertEqual(rate_limiter.rate, 10)
+            self.assertIs(suppliers.get_rate_limiter('fake'), rate_limiter)
+        with self.settings(SUPPLIER_API_RATE_LIMITS={}):
+            self.assertIsNone(suppliers.get_rate_limiter('fake'))
+
+    @mock.patch('shop.suppliers.time')
+    def test_wait(self, time_mock):
+        time_mock.monotonic.return_value = 100
+        rate_limiter = suppliers.RateLimiter(rate=4)
+        for _ in range(3):
+            rate_limiter.wait()
+        self.assertEqual(
+            [c[0][0] for c in time_mock.sleep.call_args_list],
+            [0.25, 0.5]
+        )
@@ -0,0 +1,16 @@
+from django.contrib.admin.utils import display_for_value
+from django.utils.html import format_html, format_html_join
+
+
+def html_table(header, rows):
+    """Renders rows of values as an HTML table for a read-only field."""
+    return format_html(
+        '<table><thead><tr>{}</tr></thead><tbody>{}</tbody></table>',
+        format_html_join('', '<th>{}</th>', ((title,) for title in header)),
+        format_html_join('', '<tr>{}</tr>', (
+            (format_html_join('', '<td>{}</td>', (
+                (display_for_value(value, '-'),) for value in row
+            )),)
+            for row in rows
+        ))
+    )
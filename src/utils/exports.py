@@ -0,0 +1,60 @@
+import csv
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+
+# Number of objects fetched with a single query when exporting.
+EXPORT_CHUNK_SIZE = 1000
+
+
+class _Echo:
+    """File-like object that returns what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def iterate_chunks(qs, chunk_size=None):
+    """Yields the objects of a queryset in lists, oldest first.
+
+    Each chunk is fetched with a separate query that continues after the
+    last object of the previous chunk, so related objects can be prefetched
+    per chunk while memory use does not grow with the size of the queryset.
+    The model must have the `date_created` field.
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    qs = qs.order_by('date_created', 'id')
+    last = None
+    while True:
+        chunk_qs = qs
+        if last is not None:
+            chunk_qs = qs.filter(
+                Q(date_created__gt=last.date_created) |
+                Q(date_created=last.date_created, id__gt=last.id)
+            )
+        chunk = list(chunk_qs[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+
+
+def stream_csv(header, rows):
+    """Yields the lines of a CSV file with given header and rows."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def csv_response(filename, header, rows):
+    """Returns a response streaming a CSV file as an attachment."""
+    response = StreamingHttpResponse(
+        stream_csv(header, rows),
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+        filename
+    )
+    return response
@@ -1,6 +1,10 @@
 from django.contrib import admin
+from django.core.urlresolvers import reverse
+from django.utils.html import format_html
 from django.utils.translation import ugettext_lazy as _
-from . import models, enums
+from utils.exports import csv_response
+from utils.admin import html_table
+from . import models, enums, exports
 
 
 class ReadOnlyMixin(object):
@@ -47,12 +51,28 @@ class WalletTransactionAdmin(admin.ModelAdmin):
     ordering = ('-date_created',)
     verbose_name = _('Transaction')
     verbose_name_plural = _('Transactions')
+    actions = ['export_csv']
+    # Counting all the transactions is slow and of little use.
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_status()
+
+    def export_csv(self, request, queryset):
+        return csv_response(
+            'wallet_transactions.csv',
+            exports.TRANSACTION_HEADER,
+            exports.transaction_rows(queryset)
+        )
+    export_csv.short_description = _('Export as CSV')
 
 
 @admin.register(models.Wallet)
 class WalletAdmin(ReadOnlyMixin, admin.ModelAdmin):
     list_display = ('owner_id', '_balance',)
-    readonly_fields = ('owner_id', 'balance',)
+    readonly_fields = ('owner_id', 'balance', 'transaction_history',)
+    # Number of the latest transactions shown on the change page.
+    latest_transactions = 25
     inlines = (WalletTransactionCreatorInline,)
     fieldsets = (
         (None, {
@@ -63,6 +83,7 @@ class WalletAdmin(ReadOnlyMixin, admin.ModelAdmin):
         ('Additional information', {
             'fields': (
                 'balance',
+                'transaction_history',
             )
         })
     )
@@ -72,6 +93,29 @@ class WalletAdmin(ReadOnlyMixin, admin.ModelAdmin):
         # field properly.
         return obj.balance
 
+    def transaction_history(self, obj):
+        # Only the latest transactions are shown, the rest can be found in
+        # the paginated transaction changelist.
+        if obj.id is None:
+            return None
+        trx_objs = obj.transactions.with_status() \
+            .order_by('-date_created')[:self.latest_transactions]
+        table = html_table(
+            (_('id'), _('status'), _('amount'), _('reference'),
+             _('date created')),
+            ((trx_obj.id, trx_obj.status.name, trx_obj.amount,
+              trx_obj.reference, trx_obj.date_created)
+             for trx_obj in trx_objs)
+        )
+        return format_html(
+            '{}<a href="{}?wallet__id__exact={}">{}</a>',
+            table,
+            reverse('admin:wallet_wallettransaction_changelist'),
+            obj.id,
+            _('View all transactions')
+        )
+    transaction_history.short_description = _('transaction history')
+
     class Media:
         css = {'all': ('css/hide_admin_original.css',)}
 
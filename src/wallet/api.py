@@ -1,13 +1,23 @@
+from collections import defaultdict
+from decimal import Decimal
 from django.db import transaction
-from .enums import TrxStatus
+from django.db.models import Case, DecimalField, F, Value, When
+from utils.enums import validate_transition
+from .enums import TrxDirection, TrxStatus, get_direction_multiplier
 from . import models, exceptions
 
 
-def get_wallet(owner_id, currency):
+def get_wallet(owner_id, currency, create=True):
     """Return a wallet for given owner id.
 
-    Creates a wallet if there is not one.
+    Creates a wallet if there is not one, unless `create` is False, in which
+    case None is returned.
     """
+    if not create:
+        return models.Wallet.objects.filter(
+            owner_id=owner_id,
+            balance_currency=currency
+        ).first()
     obj, created = models.Wallet.objects.get_or_create(
         owner_id=owner_id,
         balance_currency=currency
@@ -44,15 +54,44 @@ def set_balance(owner_id, new_balance, reference=None):
 
 
 def list_transactions(owner_id, currency, status=None, direction=None,
-                      start=None, limit=None):
-    """Return a list of transactions matching the criteria."""
+                      start=None, limit=None, after=None):
+    """Return a list of transactions matching the criteria.
+
+    The transactions are ordered from the newest one. Pass the creation
+    time and the id of the last transaction of a page as `after` to get the
+    next page.
+    """
     wallet_obj = get_wallet(owner_id, currency)
     qs = models.Wallet.objects.get(id=wallet_obj.id).transactions
     if status is not None:
         qs = qs.by_status(status)
     if direction is not None:
         qs = qs.by_direction(direction)
-    return qs.all()[start:limit]
+    if after is not None:
+        qs = qs.after(*after)
+    qs = qs.with_status().order_by('-date_created', '-id')
+    return qs[start:limit]
+
+
+def iterate_transactions(owner_id, currency, chunk_size, after=None):
+    """Yields all the transactions of a wallet in lists, newest first.
+
+    Each chunk is fetched with a separate query that continues after the
+    last transaction of the previous chunk. Nothing is yielded if the owner
+    has no wallet.
+    """
+    wallet_obj = get_wallet(owner_id, currency, create=False)
+    if wallet_obj is None:
+        return
+    qs = models.WalletTransaction.objects.filter(wallet_id=wallet_obj.id)
+    qs = qs.with_status().order_by('-date_created', '-id')
+    while True:
+        chunk = list((qs.after(*after) if after else qs)[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = (chunk[-1].date_created, chunk[-1].id)
 
 
 def total_balance(currency, exclude_ids=None):
@@ -68,6 +107,11 @@ def get_transactions_by_ref(reference):
     return models.WalletTransaction.objects.filter(reference=reference)
 
 
+def get_transactions_by_refs(references):
+    """Return transactions with any of given references."""
+    return models.WalletTransaction.objects.filter(reference__in=references)
+
+
 def cancel_transaction(trx_id):
     """Cancels a transaction."""
     trx_obj = models.WalletTransaction.objects.get(id=trx_id)
@@ -75,6 +119,52 @@ def cancel_transaction(trx_id):
     return trx_obj
 
 
+@transaction.atomic
+def cancel_transactions(trx_ids):
+    """Cancels several transactions at once.
+
+    The same as calling `cancel_transaction` for every transaction, but done
+    in a fixed number of queries, however many transactions there are. The
+    wallet balances are adjusted in a single statement, so no status change
+    signals are sent.
+    """
+    trx_objs = models.WalletTransaction.objects.filter(
+        id__in=trx_ids
+    ).with_status()
+    status_objs = []
+    deltas = defaultdict(Decimal)
+    for trx_obj in trx_objs:
+        validate_transition(
+            TrxStatus,
+            from_state=trx_obj.status,
+            to_state=TrxStatus.CANCELLATION
+        )
+        if trx_obj.amount.amount < 0:
+            direction = TrxDirection.OUTGOING
+        else:
+            direction = TrxDirection.INCOMING
+        multiplier = get_direction_multiplier(
+            enum=TrxStatus,
+            from_state=trx_obj.status,
+            to_state=TrxStatus.CANCELLATION,
+            direction=direction
+        )
+        deltas[trx_obj.wallet_id] += multiplier * trx_obj.amount.amount
+        status_objs.append(models.WalletTransactionStatus(
+            trx=trx_obj,
+            status=TrxStatus.CANCELLATION
+        ))
+    models.WalletTransactionStatus.objects.bulk_create(status_objs)
+    deltas = {wallet_id: delta for wallet_id, delta in deltas.items() if delta}
+    if deltas:
+        cases = [When(id=wallet_id, then=Value(delta))
+                 for wallet_id, delta in deltas.items()]
+        models.Wallet.objects.filter(id__in=deltas).update(
+            balance=F('balance') + Case(*cases, output_field=DecimalField())
+        )
+    return trx_objs
+
+
 def finalize_transaction(trx_id):
     """Finalizes a transaction."""
     trx_obj = models.WalletTransaction.objects.get(id=trx_id)
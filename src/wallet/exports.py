@@ -0,0 +1,23 @@
+from utils.exports import iterate_chunks
+
+TRANSACTION_HEADER = (
+    'id', 'date_created', 'owner_id', 'amount', 'currency', 'reference',
+    'status',
+)
+
+
+def transaction_rows(qs):
+    """Yields CSV rows of wallet transactions with their current status."""
+    qs = qs.select_related('wallet').with_status()
+    for chunk in iterate_chunks(qs):
+        for trx_obj in chunk:
+            states = trx_obj.latest_states
+            yield (
+                trx_obj.id,
+                trx_obj.date_created.isoformat(),
+                trx_obj.wallet.owner_id,
+                trx_obj.amount.amount,
+                trx_obj.amount.currency,
+                trx_obj.reference or '',
+                states[0].status.name if states else '',
+            )
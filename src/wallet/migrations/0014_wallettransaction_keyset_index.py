@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0013_auto_20170324_1535'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='wallettransaction',
+            index_together=set([('wallet', 'date_created', 'id')]),
+        ),
+    ]
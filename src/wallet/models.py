@@ -78,6 +78,21 @@ class WalletTrxsQuerySet(models.QuerySet):
         amount = self.aggregate(amount=models.Sum('amount'))['amount']
         return Money(amount or 0, currency or settings.DEFAULT_CURRENCY)
 
+    def with_status(self):
+        # Fetch the states of all the transactions in a single query, so
+        # that the status does not have to be queried per transaction. The
+        # states are ordered from the newest by default.
+        return self.prefetch_related(
+            models.Prefetch('states', to_attr='latest_states')
+        )
+
+    def after(self, date_created, id):
+        # Transactions following given one, when ordered from the newest
+        return self.filter(
+            Q(date_created__lt=date_created) |
+            Q(date_created=date_created, id__lt=id)
+        )
+
     def balance(self, currency=None):
         return self.countable().sum(currency)
 
@@ -98,9 +113,13 @@ class WalletTransaction(UUIDModel, TimeStampedModel):
     class Meta:
         verbose_name = _('transaction')
         verbose_name_plural = _('transactions')
+        index_together = [('wallet', 'date_created', 'id')]
 
     @property
     def status(self):
+        if hasattr(self, 'latest_states'):
+            # The states have been prefetched
+            return self.latest_states[0].status
         # As a transaction should never _not_ be in a state, we want
         # latest to throw an exception when this does not happen
         state = self.states.latest('date_created')
@@ -0,0 +1,63 @@
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .. import models
+from . import factories
+
+
+class WalletAdminTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            'the_baconator',
+            'bacon@foobar.com',
+            '123'
+        )
+        self.client.force_login(self.user)
+        # The first request to the admin creates the system wallets.
+        self.client.get(reverse('admin:index'))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_wallet_change(self):
+        wallet_obj = factories.WalletFactory()
+        url = reverse('admin:wallet_wallet_change', args=(wallet_obj.id,))
+        factories.WalletTrxWithStatusFactory.create_batch(
+            size=2,
+            wallet=wallet_obj
+        )
+        self.client.get(url)
+        num_queries = self.count_queries(url)
+        factories.WalletTrxWithStatusFactory.create_batch(
+            size=30,
+            wallet=wallet_obj
+        )
+        self.assertEqual(self.count_queries(url), num_queries)
+        response = self.client.get(url)
+        model_admin = admin.site._registry[models.Wallet]
+        table = model_admin.transaction_history(wallet_obj)
+        # The header row followed by the latest transactions.
+        self.assertEqual(table.count('<tr>'), 26)
+        self.assertContains(response, table, html=True)
+
+        history_url = '{}?wallet__id__exact={}'.format(
+            reverse('admin:wallet_wallettransaction_changelist'),
+            wallet_obj.id
+        )
+        self.assertContains(response, history_url)
+        factories.WalletTrxWithStatusFactory()
+        num_queries = self.count_queries(history_url)
+        factories.WalletTrxWithStatusFactory.create_batch(
+            size=10,
+            wallet=wallet_obj
+        )
+        self.assertEqual(self.count_queries(history_url), num_queries)
+        response = self.client.get(history_url)
+        self.assertEqual(response.context['cl'].result_count, 42)
@@ -64,6 +64,42 @@ class WalletTest(TestCase):
         )
         self.assertEqual(len(trxs), 6)
 
+    def test_list_transactions_pages(self):
+        wallet_obj = factories.WalletFactory.create()
+        trxs = factories.WalletTrxFactory.create_batch(
+            wallet=wallet_obj,
+            size=5
+        )
+        [x.set_status(enums.TrxStatus.PENDING) for x in trxs]
+        # Some of the transactions are created at the same time.
+        models.WalletTransaction.objects.filter(
+            id__in=[trxs[1].id, trxs[2].id, trxs[3].id]
+        ).update(date_created=trxs[1].date_created)
+        trx_ids = []
+        after = None
+        while True:
+            with self.assertNumQueries(4):
+                page = list(api.list_transactions(
+                    wallet_obj.owner_id,
+                    wallet_obj.currency,
+                    limit=2,
+                    after=after
+                ))
+                for trx_obj in page:
+                    self.assertEqual(trx_obj.status, enums.TrxStatus.PENDING)
+            trx_ids.extend(trx_obj.id for trx_obj in page)
+            if len(page) < 2:
+                break
+            after = (page[-1].date_created, page[-1].id)
+        self.assertEqual(
+            trx_ids,
+            list(api.list_transactions(
+                wallet_obj.owner_id,
+                wallet_obj.currency
+            ).values_list('id', flat=True))
+        )
+        self.assertEqual(set(trx_ids), {trx_obj.id for trx_obj in trxs})
+
     def test_get_balance(self):
         wallet_obj = factories.WalletFactory.create()
         _, balance1 = api.get_balance(wallet_obj.owner_id, wallet_obj.currency)